@@ -0,0 +1,131 @@
+"""
+Unit tests for the Yuki kernel jobs and workflows.
+
+The tests build a minimal ~/.Yuki tree in a temporary HOME and exercise the
+kernel classes on it directly.
+"""
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import yaml
+
+from Yuki.kernel.container_job import ContainerJob
+from Yuki.kernel.dry_workflow import DryWorkflow
+from Yuki.kernel.vjob import VJob
+
+PROJECT = "p" * 32
+MACHINE = "m" * 32
+
+
+class KernelTestCase(unittest.TestCase):
+    """Base class providing a temporary HOME with an empty Yuki storage."""
+
+    def setUp(self):
+        self.home = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.home, ignore_errors=True)
+        patcher = mock.patch.dict(os.environ, {"HOME": self.home})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.yuki = os.path.join(self.home, ".Yuki")
+        os.makedirs(self.yuki)
+        with open(os.path.join(self.yuki, "config.json"), "w") as f:
+            json.dump({"backend_types": {MACHINE: "dry"}}, f)
+
+    def make_job(self, uuid, config, celebi_yaml, status=None):
+        """Create the storage directory of a job and return its path."""
+        path = os.path.join(self.yuki, "Storage", PROJECT, uuid)
+        os.makedirs(os.path.join(path, "contents"))
+        with open(os.path.join(path, "config.json"), "w") as f:
+            json.dump(config, f)
+        with open(os.path.join(path, "contents", "celebi.yaml"), "w") as f:
+            yaml.dump(celebi_yaml, f)
+        with open(os.path.join(path, "status.json"), "w") as f:
+            json.dump(status or {"status": "raw"}, f)
+        return path
+
+
+class TestContainerJobSubstitution(KernelTestCase):
+    """Placeholder substitution in the user commands of a task."""
+
+    def setUp(self):
+        super().setUp()
+        self.input_uuid = "b" * 32
+        path = self.make_job(
+            "d" * 32,
+            {"object_type": "task", "dependencies": [],
+             "alias_to_impression": {"data": self.input_uuid}},
+            {"parameters": {"outdir": "${output}/plots", "tag": "${data}-${unknown}"}},
+        )
+        self.job = ContainerJob(path, MACHINE)
+
+    def test_parameter_value_expands_paths(self):
+        self.assertEqual(self.job._substitute("mkdir -p ${outdir}"), "mkdir -p impddddddd/plots")
+
+    def test_parameter_value_expands_inputs(self):
+        self.assertEqual(self.job._substitute("echo ${tag}"), "echo ../impbbbbbbb-${unknown}")
+
+    def test_nested_shell_default_expands_inner_placeholder(self):
+        self.assertEqual(self.job._substitute("echo ${OUT:-${output}}/x"), "echo ${OUT:-impddddddd}/x")
+
+
+class TestDryWorkflowStaging(KernelTestCase):
+    """Staging of rawdata into a local workflow must not touch Storage."""
+
+    def setUp(self):
+        super().setUp()
+        path = self.make_job(
+            "1" * 32,
+            {"object_type": "task", "dependencies": [], "tree": []},
+            {"environment": "rawdata"},
+            {"status": "archived"},
+        )
+        os.makedirs(os.path.join(path, "rawdata"))
+        self.stored = os.path.join(path, "rawdata", "d.txt")
+        with open(self.stored, "w") as f:
+            f.write("stored")
+
+        self.workflow = DryWorkflow(PROJECT, [], "w" * 32)
+        self.addCleanup(self.workflow.close)
+        self.workflow.jobs = [VJob(path, MACHINE)]
+        with open(self.workflow.snakefile_path, "w") as f:
+            f.write("rule all:\n")
+        self.staged = os.path.join(
+            self.workflow.local_exec_path, "imp1111111", "stageout", "d.txt")
+
+    def run_setup_copy(self):
+        """Overwrite the staged file the way the setup rule's cp does."""
+        eos_file = os.path.join(self.home, "eos.txt")
+        with open(eos_file, "w") as f:
+            f.write("from eos")
+        shutil.copyfile(eos_file, self.staged)
+
+    def read_stored(self):
+        with open(self.stored) as f:
+            return f.read()
+
+    def test_setup_copy_keeps_storage(self):
+        self.workflow.copy_files_local()
+        self.assertEqual(os.stat(self.staged).st_nlink, 1)
+        self.run_setup_copy()
+        self.assertEqual(self.read_stored(), "stored")
+
+    def test_download_keeps_subdirectories(self):
+        impression = "2" * 32
+        stageout = os.path.join(self.workflow.local_exec_path, "imp2222222", "stageout")
+        os.makedirs(os.path.join(stageout, "plots"))
+        for name in ("out.txt", os.path.join("plots", "a.png")):
+            with open(os.path.join(stageout, name), "w") as f:
+                f.write(name)
+        self.workflow.download(impression)
+        collected = os.path.join(self.yuki, "Storage", PROJECT, impression, "", "stageout")
+        with open(os.path.join(collected, "plots", "a.png")) as f:
+            self.assertEqual(f.read(), os.path.join("plots", "a.png"))
+        self.assertTrue(os.path.isfile(os.path.join(collected, "out.txt")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,10 +5,64 @@ This module contains the VJob abstract base class which represents a virtual job
 that can include VVolume, ImageJob, ContainerJob and other related entities.
 """
 import os
-import time
+import re
 from abc import ABC, abstractmethod
+from datetime import datetime
+from functools import cached_property
+
+from ..utils.cached_metadata import CachedConfigFile, CachedYamlFile, yuki_config
+
+_SUBCLASSES = None
+
+# Statuses a workflow step or workflow can report; anything else (e.g. an
+# error message returned in place of a status) is not stored as the job status.
+_STEP_STATUSES = frozenset({
+    "raw", "waiting", "created", "queued", "pending", "running",
+    "success", "finished", "failed", "stopped", "deleted", "unknown",
+    # written by DryWorkflow.kill
+    "killed",
+})
+# Celery-style workflow states mapped by update_status()
+_WORKFLOW_TO_JOB_STATUS = {"PENDING": "running", "SUCCESS": "success"}
+# Job statuses that workflow polling never changes
+_FINAL_STATUSES = frozenset({"finished", "success", "failed"})
+# ${name} placeholder of user commands and build rules. "$", "{" and "}" end
+# the name, so in a shell default like "${OUT:-${output}}" only the inner
+# placeholder matches, as with the plain str.replace substitution.
+_PLACEHOLDER = re.compile(r"\$\{([^${}]+)\}")
+
+
+def expand_placeholders(text, substitutions):
+    """
+    Replace all ${...} placeholders in text in a single pass.
+
+    Unknown placeholders are left untouched.
+
+    Args:
+        text (str): Text with placeholders
+        substitutions (dict): Mapping from placeholder name to its replacement
+
+    Returns:
+        str: Text with placeholders substituted
+    """
+    if "${" not in text:
+        return text
+    return _PLACEHOLDER.sub(
+        lambda match: substitutions.get(match.group(1), match.group(0)),
+        text
+    )
+
+
+def _job_subclasses():
+    """Map object types to VJob subclasses, importing them on first use."""
+    global _SUBCLASSES
+    if _SUBCLASSES is None:
+        # Imported lazily to avoid circular imports
+        from ..kernel.image_job import ImageJob
+        from ..kernel.container_job import ContainerJob
+        _SUBCLASSES = {"algorithm": ImageJob, "task": ContainerJob}
+    return _SUBCLASSES
 
-from CelebiChrono.utils import metadata
 
 class VJob(ABC):
     """Abstract base class for virtual job objects, including VVolume, ImageJob, ContainerJob."""
@@ -18,53 +72,89 @@ class VJob(ABC):
         self._use_eos = None
         self._use_kerberos = None
         self._environment = None
+        self._job_type = None
+        self._dependencies = None
         self._workflow = None
 
-        self.is_input = False
+        self._is_input = None
         self.path = path
+        self._project_path = path[:-32]
+        self._error_path = path + "/error"
         self.uuid = path[-32:]
+        self._short_uuid = self.uuid[:7]
         self.project_uuid = path[-64-1:-32-1]
-        self.machine_id = machine_id
-        self.config_file = metadata.ConfigFile(
-            os.path.join(self.path, "config.json")
-            )
-        self.yaml_file = metadata.YamlFile(
-            os.path.join(self.path, "contents", "celebi.yaml")
-        )
-        if self.environment() == "rawdata":
-            self.is_input = True
-        if machine_id is None:
-            status_file = metadata.ConfigFile(
-                os.path.join(self.path, "status.json")
-                )
-            self.machine_id = status_file.read_variable("machine_id", None)
-        if self.machine_id is not None:
-            self.run_path = os.path.join(self.path, self.machine_id, "run")
-            self.run_config_file = metadata.ConfigFile(
-                os.path.join(self.path, self.machine_id, "config.json")
-                )
+        # Without an explicit machine id it is resolved from status.json on first use
+        if machine_id is not None:
+            self.machine_id = machine_id
+
+    @cached_property
+    def config_file(self):
+        """The config.json of the job."""
+        return CachedConfigFile(self.path + "/config.json")
+
+    @cached_property
+    def yaml_file(self):
+        """The celebi.yaml of the job."""
+        return CachedYamlFile(self.path + "/contents/celebi.yaml")
+
+    @cached_property
+    def status_file(self):
+        """The status.json of the job."""
+        return CachedConfigFile(self.path + "/status.json")
+
+    @cached_property
+    def machine_id(self):
+        """The machine the job runs on, as recorded in status.json."""
+        return self.status_file.read_variable("machine_id", None)
+
+    @cached_property
+    def _machine_path(self):
+        """The per-machine directory of the job."""
+        return f"{self.path}/{self.machine_id}"
+
+    @cached_property
+    def run_path(self):
+        """The run directory of the job on its machine."""
+        return self._machine_path + "/run"
+
+    @cached_property
+    def run_config_file(self):
+        """The per-machine config.json of the job."""
+        return CachedConfigFile(self._machine_path + "/config.json")
+
+    @property
+    def is_input(self):
+        """Whether the job is an input of the workflow rather than a step to run."""
+        if self._is_input is None:
+            self._is_input = self.environment() == "rawdata"
+        return self._is_input
+
+    @is_input.setter
+    def is_input(self, value):
+        self._is_input = value
+
+    @classmethod
+    def from_path_lazy(cls, path, machine_id):
+        """
+        Create a plain job handle without resolving its ImageJob/ContainerJob type.
+
+        Nothing is read from disk until the handle is used, which keeps walking
+        the dependencies of a job cheap.
+        """
+        job = object.__new__(cls)
+        VJob.__init__(job, path, machine_id)
+        return job
 
     def __new__(cls, path, machine_id):
         """Factory method to automatically create suitable ImageJob or ContainerJob."""
         # If VJob is being directly instantiated, determine the correct subclass
         if cls is VJob:
-            # Create a temporary instance to read the object type
-            temp_instance = object.__new__(cls)
-            temp_instance.__init__(path, machine_id)
-            job_type = temp_instance.job_type()
-
-            # Import here to avoid circular imports
-            from ..kernel.image_job import ImageJob
-            from ..kernel.container_job import ContainerJob
-
-            # Create the appropriate subclass instance
-            if job_type == "algorithm":
-                return object.__new__(ImageJob)
-            elif job_type == "task":
-                return object.__new__(ContainerJob)
-            else:
-                # Default to ContainerJob for unknown types
-                return object.__new__(ContainerJob)
+            # Only the object type is needed to pick the subclass
+            job_type = CachedConfigFile(path + "/config.json").read_variable("object_type", "")
+
+            # Create the appropriate subclass instance, ContainerJob for unknown types
+            subclasses = _job_subclasses()
+            return object.__new__(subclasses.get(job_type, subclasses["task"]))
         else:
             # Normal instantiation for subclasses
             return object.__new__(cls)
@@ -83,12 +173,13 @@ class VJob(ABC):
 
     def job_type(self):
         """Return the type of the object under a specific path."""
-        # print("job_type", self.config_file.read_variable("object_type", ""))
-        return self.config_file.read_variable("object_type", "")
+        if self._job_type is None:
+            self._job_type = self.config_file.read_variable("object_type", "")
+        return self._job_type
 
     def object_type(self):
         """Return the type of the object under a specific path."""
-        return self.config_file.read_variable("object_type", "")
+        return self.job_type()
 
     def is_zombie(self):
         """Check if this job is a zombie (empty job type)."""
@@ -105,6 +196,7 @@ class VJob(ABC):
     def set_workflow_id(self, workflow_uuid):
         """Set the workflow ID for this job."""
         self.run_config_file.write_variable("workflow", workflow_uuid)
+        self._workflow = workflow_uuid
 
     def workflow_id(self):
         """Get the workflow ID for this job."""
@@ -118,16 +210,12 @@ class VJob(ABC):
         """Get the environment type from the YAML configuration."""
         if self._environment is not None:
             return self._environment
-        yaml_file = metadata.YamlFile(
-            os.path.join(self.path, "contents", "celebi.yaml")
-            )
-        self._environment = yaml_file.read_variable("environment", "")
+        self._environment = self.yaml_file.read_variable("environment", "")
         return self._environment
 
     def status(self):
         """Get the current status of the job."""
-        config_file = metadata.ConfigFile(os.path.join(self.path, "status.json"))
-        status = config_file.read_variable("status", "raw")
+        status = self.status_file.read_variable("status", "raw")
         if status != "raw":
             return status
         return "raw"
@@ -146,32 +234,27 @@ class VJob(ABC):
     def use_kerberos(self):
         if self._use_kerberos is not None:
             return self._use_kerberos
-        config = metadata.ConfigFile(os.path.join(os.environ["HOME"], ".Yuki", "config.json"))
-        self._use_kerberos = config.read_variable("use_kerberos", {}).get(self.machine_id, False)
+        use_kerberos = yuki_config().read_variable("use_kerberos", {})
+        self._use_kerberos = use_kerberos.get(self.machine_id, False)
         return self._use_kerberos
 
     def set_status(self, status):
         """Set the status of the job."""
-        config_file = metadata.ConfigFile(os.path.join(self.path, "status.json"))
-        config_file.write_variable("status", status)
+        self.status_file.write_variable("status", status)
 
-    def update_data_status(self, status):
-        """Update the data status of the job."""
-        config_file = metadata.ConfigFile(os.path.join(self.path, "status.json"))
-        config_file.write_variable("status", status)
+    # Updating the data status is the same write as setting the status
+    update_data_status = set_status
 
     def update_status(self, status):
         """Update the status based on workflow status."""
-        config_file = metadata.ConfigFile(os.path.join(self.path, "status.json"))
-        if status == "PENDING":
-            config_file.write_variable("status", "running")
-        if status == "SUCCESS":
-            config_file.write_variable("status", "success")
+        job_status = _WORKFLOW_TO_JOB_STATUS.get(status)
+        if job_status is not None:
+            self.set_status(job_status)
 
     def _read_workflow_results(self, workflow_path, logger=None):
         """Read workflow results and return status."""
         try:
-            results_file = metadata.ConfigFile(os.path.join(workflow_path, "results.json"))
+            results_file = CachedConfigFile(workflow_path + "/results.json")
             results = results_file.read_variable("results", {})
             return results.get("status", "unknown")
         except Exception:
@@ -184,10 +267,11 @@ class VJob(ABC):
     def _find_matched_step(self, workflow_path, logger=None):
         """Find the matched step in workflow log for this job."""
         try:
-            log_file = metadata.ConfigFile(os.path.join(workflow_path, "log.json"))
+            log_file = CachedConfigFile(workflow_path + "/log.json")
             log = log_file.read_variable("logs", {})
+            job_name = f"step{self._short_uuid}"
             for step in log.values():
-                if step.get("job_name", "") == f"step{self.short_uuid()}":
+                if step.get("job_name", "") == job_name:
                     return step
         except Exception:
             if logger:
@@ -200,79 +284,97 @@ class VJob(ABC):
         """Write step logs to the job's log directory."""
         if matched_step and matched_step.get("status") in ("finished", "failed"):
             logs = matched_step.get("logs", "")
-            log_dir = os.path.join(self.path, self.machine_id, "logs")
-            if not os.path.exists(log_dir):
-                os.makedirs(log_dir)
-            with open(os.path.join(log_dir, "celebi.stdout"), "w", encoding='utf-8') as f:
+            log_dir = self._machine_path + "/logs"
+            os.makedirs(log_dir, exist_ok=True)
+            with open(log_dir + "/celebi.stdout", "w", encoding='utf-8') as f:
                 f.write(logs)
-            config_file = metadata.ConfigFile(os.path.join(self.path, self.machine_id, "status.json"))
+            config_file = CachedConfigFile(self._machine_path + "/status.json")
             # print(matched_step)
             start_time = matched_step.get("started_at", "")
             end_time = matched_step.get("finished_at", "")
-            config_file.write_variable("status", matched_step.get("status", ""))
-            config_file.write_variable("started_at", start_time)
-            config_file.write_variable("finished_at", end_time)
-            # Format of times:
-            # 2026-01-21T16:40:34
-            # 2026-01-21T16:40:41
-            time_format = "%Y-%m-%dT%H:%M:%S"
-            # Get the end_time - start_time in seconds
-            start_struct = time.strptime(start_time, time_format)
-            end_struct = time.strptime(end_time, time_format)
-            start_epoch = time.mktime(start_struct)
-            end_epoch = time.mktime(end_struct)
-            duration = int(end_epoch - start_epoch)
-            config_file.write_variable("duration", duration)
-
-    def _update_job_status(self, config_file, current_status, step_status, full_workflow_status, logger=None):
-        """Update job status based on current status, step status, and workflow status."""
+            updates = {
+                "status": matched_step.get("status", ""),
+                "started_at": start_time,
+                "finished_at": end_time,
+            }
+            try:
+                # Format of times:
+                # 2026-01-21T16:40:34
+                # 2026-01-21T16:40:41
+                # Get the end_time - start_time in seconds
+                elapsed = datetime.fromisoformat(end_time) - datetime.fromisoformat(start_time)
+                updates["duration"] = int(elapsed.total_seconds())
+            finally:
+                config_file.write_variables(updates)
+
+    def _update_job_status(self, current_status, step_status, full_workflow_status, logger=None):
+        """
+        Decide the new job status from the current status, step status, and workflow status.
+
+        Returns None if the status should be left unchanged.
+        """
         if logger:
             logger(f"Job {self.short_uuid()} new status: {step_status}")
         else:
             print("New status:", step_status)
 
         if current_status == "raw":
-            if len(step_status) < 20:
-                config_file.write_variable("status", step_status)
+            if step_status in _STEP_STATUSES:
+                return step_status
         elif current_status == "running":
             if step_status == "success":
-                config_file.write_variable("status", "success")
+                return "success"
             elif step_status == "finished":
-                config_file.write_variable("status", "finished")
+                return "finished"
             elif step_status in ("failed", "stopped"):
-                config_file.write_variable("status", "failed")
+                return "failed"
             elif full_workflow_status == "failed":
-                config_file.write_variable("status", "failed")
+                return "failed"
         elif current_status in ('stopped', 'deleted'):
-            config_file.write_variable("status", "failed")
+            return "failed"
         elif current_status in ('finished', 'success', 'failed'):
             pass
         else:
-            if len(step_status) < 20:
-                config_file.write_variable("status", step_status)
-            else:
-                config_file.write_variable("status", "unknown")
+            if step_status in _STEP_STATUSES:
+                return step_status
+            return "unknown"
+        return None
 
     def update_status_from_workflow(self, workflow_path, logger=None):
         """Update job status based on workflow status."""
+        # Both reads are served by one parse of status.json
+        current_status = self.status_file.read_variable("status", "raw")
+        machine_id_changed = self.status_file.read_variable("machine_id", None) != self.machine_id
+        if current_status in _FINAL_STATUSES and not machine_id_changed:
+            return
+
         if self.job_type() == "algorithm":
             return
 
-        config_file = metadata.ConfigFile(os.path.join(self.path, "status.json"))
-        current_status = config_file.read_variable("status", "raw")
-        config_file.write_variable("machine_id", self.machine_id)
+        # machine_id and the new status go to status.json in one write
+        updates = {"machine_id": self.machine_id} if machine_id_changed else {}
+        try:
+            new_status = self._poll_workflow_status(workflow_path, current_status, logger)
+            if new_status is not None and new_status != current_status:
+                updates["status"] = new_status
+        finally:
+            if updates:
+                self.status_file.write_variables(updates)
+
+    def _poll_workflow_status(self, workflow_path, current_status, logger=None):
+        """Work out the new job status from the workflow results, or None to keep it."""
         if logger:
             logger(f"Job {self.short_uuid()} current status: {current_status}")
         else:
             print("Current status is: ", current_status)
 
-        if current_status in ('finished', 'success', 'failed'):
-            return
+        if current_status in _FINAL_STATUSES:
+            return None
 
         # Read workflow results
         full_workflow_status = self._read_workflow_results(workflow_path, logger)
         if full_workflow_status is None:
-            return
+            return None
 
         if logger:
             logger(f"Full workflow status: {full_workflow_status}")
@@ -293,54 +395,55 @@ class VJob(ABC):
             self._write_step_logs(matched_step)
 
         # Update job status
-        self._update_job_status(config_file, current_status, status, full_workflow_status, logger)
+        return self._update_job_status(current_status, status, full_workflow_status, logger)
 
     def error(self):
         """Get error message if any."""
-        error_path = self.path + "/error"
-        if os.path.exists(error_path):
-            with open(error_path, encoding='utf-8') as f:
-                return f.read()
-        return ""
+        try:
+            fd = os.open(self._error_path, os.O_RDONLY)
+        except FileNotFoundError:
+            return ""
+        try:
+            data = os.read(fd, os.fstat(fd).st_size)
+        finally:
+            os.close(fd)
+        return data.decode("utf-8")
 
     def append_error(self, message):
         """Append an error message to the error file."""
-        with open(self.path + "/error", "w", encoding='utf-8') as f:
+        with open(self._error_path, "w", encoding='utf-8') as f:
             f.write(message)
             f.write("\n")
 
     def dependencies(self):
         """Return the predecessor of the object."""
-        return self.config_file.read_variable("dependencies", [])
+        if self._dependencies is None:
+            self._dependencies = self.config_file.read_variable("dependencies", [])
+        return self._dependencies
 
     def files(self):
         """Get list of files in this job."""
-        file_list = []
         tree = self.config_file.read_variable("tree", [])
-        for dirpath, _, filenames in tree:
-            for f in filenames:
-                if f == "celebi.yaml":
-                    continue
-                name = f"{self.short_uuid()}"
-                if dirpath == ".":
-                    name = os.path.join(name, f)
-                else:
-                    name = os.path.join(name, dirpath, f)
-                file_list.append(name)
-        return file_list
+        short_uuid = self._short_uuid
+        # dirpath comes from the user's tree, so keep os.path.join for it
+        return [
+            f"{short_uuid}/{f}" if dirpath == "." else os.path.join(short_uuid, dirpath, f)
+            for dirpath, _, filenames in tree
+            for f in filenames
+            if f != "celebi.yaml"
+        ]
 
     def predecessors(self):
-        """Get predecessor VJob objects."""
+        """Get lightweight VJob handles of the predecessors."""
         dep = self.dependencies()
         # path = os.path.join(os.environ["HOME"], ".Yuki", "Storage", self.project_uuid)
-        path = self.path[:-32]
-        return [VJob(os.path.join(path, x), self.machine_id) for x in dep]
+        path = self._project_path
+        return [VJob.from_path_lazy(path + x, self.machine_id) for x in dep]
 
     def impression(self):
         """Get the impression UUID."""
-        impression = self.path[-32:]
-        return impression
+        return self.uuid
 
     def short_uuid(self):
         """Get the short UUID (first 7 characters)."""
-        return self.impression()[:7]
+        return self._short_uuid
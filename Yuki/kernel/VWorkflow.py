@@ -11,17 +11,134 @@ This module defines the abstract VWorkflow class which:
 import os
 import time
 import json
+import logging
+import threading
 from abc import ABC, abstractmethod
-from PIL import Image, ImageDraw, ImageFont
+from concurrent.futures import ThreadPoolExecutor
 
-from CelebiChrono.utils import csys, metadata
+from CelebiChrono.utils import csys
 from CelebiChrono.kernel.chern_cache import ChernCache
 from Yuki.kernel.vjob import VJob
 from Yuki.kernel.container_job import ContainerJob
 from Yuki.kernel.image_job import ImageJob
 from Yuki.utils import snakefile
+from Yuki.utils.cached_metadata import CachedConfigFile, yuki_config
+
+_log = logging.getLogger("YukiLogger")
 
 CHERN_CACHE = ChernCache.instance()
+# Upper bound on concurrent status requests to one workflow backend
+_MAX_STATUS_POLLS = 16
+# Seconds a refreshed workflow status is reused, as the status cache in status()
+_REFRESH_TTL = 1.0
+# Snakemake rules and steps of jobs, see VWorkflow._job_rule
+_RULE_MEMO = {}
+_MAX_RULE_MEMO = 4096
+# How long to wait for input workflows, and the longest pause between checks (s)
+_DEPENDENCY_TIMEOUT = 600
+_MAX_POLL_INTERVAL = 30.0
+# Watermark fonts by size; FreeType faces are not shared between threads
+_WATERMARK_FONTS = threading.local()
+
+# Snakefile head rule, and the rules staging EOS inputs in (setup) and out (finalize)
+_ALL_RULE = (
+    "rule all:\n"
+    "    input:\n"
+    "        \"finalize.done\",\n"
+)
+_STAGING_RULE = (
+    "\n\n"
+    "rule {name}:\n"
+    "    input:\n"
+    "{inputs}"
+    "    output:\n"
+    "        {output}\n"
+    "    container:\n"
+    "        \"docker://docker.io/reanahub/reana-env-root6:6.18.04\"\n"
+    "    resources:\n"
+    "{resources}"
+    "        kubernetes_memory_limit=\"1Gi\"\n"
+    "    shell:\n"
+    "        \"{commands}\"\n"
+)
+# Snakefile rule of one job; resources are filled with one of the blocks below
+_STEP_RULE = (
+    "\n\n"
+    "rule step{short_uuid}:\n"
+    "    input:\n"
+    "{inputs}"
+    "    output:\n"
+    "        \"{short_uuid}.done\"\n"
+    "    container:\n"
+    "        \"docker://{environment}\"\n"
+    "    resources:\n"
+    "{resources}"
+    "    shell:\n"
+    "        \"{commands}\"\n"
+)
+_KERBEROS_RESOURCES = "        kerberos=True,\n"
+_HTCONDOR_RESOURCES = (
+    "        compute_backend=\"htcondorcern\",\n"
+    "        htcondor_max_runtime=\"espresso\",\n"
+    "        kerberos=True,\n"
+)
+_KUBERNETES_RESOURCES = "        kubernetes_memory_limit=\"{memory}\"\n"
+
+
+def _results_stamp(workflow_path):
+    """
+    Get the modification stamp of a workflow's results and step logs.
+
+    Returns:
+        tuple: (st_mtime_ns, st_size) of results.json and log.json, None if missing
+    """
+    stamp = []
+    for name in ("results.json", "log.json"):
+        try:
+            stat = os.stat(os.path.join(workflow_path, name))
+            stamp.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def _watermark_font(font_size):
+    """Load the watermark font once per size and thread, falling back to Pillow's default."""
+    from PIL import ImageFont
+    fonts = getattr(_WATERMARK_FONTS, "fonts", None)
+    if fonts is None:
+        fonts = _WATERMARK_FONTS.fonts = {}
+    font = fonts.get(font_size)
+    if font is None:
+        try:
+            font = ImageFont.truetype("arial.ttf", font_size)
+        except (OSError, ImportError):
+            font = ImageFont.load_default()
+        fonts[font_size] = font
+    return font
+
+
+def _watermark_png(source, target, text):
+    """Draw text in the top-right corner of the PNG at source and save it to target."""
+    # Pillow is only needed for watermarking, keep it out of the module import
+    from PIL import Image, ImageDraw
+    image = Image.open(source)
+    # Draw directly on RGB(A) images; other modes (palette, greyscale) need RGBA
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA")
+    draw = ImageDraw.Draw(image)
+
+    # Font size scales with the image, position is 10px from the top-right corner
+    font = _watermark_font(int(min(image.size) / 20))
+    textwidth = draw.textlength(text, font=font)
+    x = image.size[0] - textwidth - 10
+    y = 10
+
+    draw.text((x, y), text, font=font, fill=(0, 0, 0, 255))
+    # The zlib level dominates the save time; fast compression is enough for
+    # the watermarked copies
+    image.save(target, format="PNG", compress_level=1)
+
 
 class VWorkflow(ABC):
     """Abstract base class representing a workflow.
@@ -35,15 +152,23 @@ class VWorkflow(ABC):
     def __init__(self, project_uuid, jobs, uuid=None, machine_id=None):
         self.project_uuid = project_uuid
         self.uuid = uuid or csys.generate_uuid()
-        self.path = os.path.join(os.environ["HOME"], ".Yuki", "Workflows", self.project_uuid, self.uuid)
+        self._yuki_home = os.path.join(os.environ["HOME"], ".Yuki")
+        self._storage_prefix = os.path.join(self._yuki_home, "Storage", self.project_uuid)
+        self._workflow_prefix = os.path.join(self._yuki_home, "Workflows", self.project_uuid)
+        self.path = os.path.join(self._workflow_prefix, self.uuid)
+        self._name = f"w-{self.project_uuid[:8]}-{self.uuid[:8]}"
         os.makedirs(self.path, exist_ok=True)
 
-        self.config_file = metadata.ConfigFile(os.path.join(self.path, "config.json"))
+        self.config_file = CachedConfigFile(os.path.join(self.path, "config.json"))
         self.jobs = []
+        self._job_cache = {}
         self.dependencies = {}
         self.steps = []
         self.snakefile_path = os.path.join(self.path, "Snakefile")
         self.log_path = os.path.join(self.path, "workflow.log")
+        self._log_file = None
+        # Workflow uuid -> time of its last status refresh, see _refresh_workflows
+        self._status_ttl = {}
 
         if uuid:
             self.start_job = None
@@ -51,7 +176,7 @@ class VWorkflow(ABC):
             # load the jobs from the config file
             jobs_info = self.config_file.read_variable("jobs_info", {})
             for job_uuid, info in jobs_info.items():
-                job_path = os.path.join(os.environ["HOME"], ".Yuki", "Storage", self.project_uuid, job_uuid)
+                job_path = os.path.join(self._storage_prefix, job_uuid)
                 job = VJob(job_path, self.machine_id)
                 job.is_input = info.get("is_input", False)
                 self.jobs.append(job)
@@ -61,12 +186,34 @@ class VWorkflow(ABC):
             self.config_file.write_variable("machine_id", self.machine_id)
 
     def logger(self, message):
-        """Log message with timestamp to both console and the workflow log file."""
+        """Log message with timestamp to the workflow log file, echoed at debug level to YukiLogger."""
         timestamp = time.strftime("[%Y-%m-%d %H:%M:%S]", time.localtime())
         log_message = f"{timestamp} {message}"
-        print(log_message)
-        with open(self.log_path, "a") as f:
-            f.write(log_message + "\n")
+        # Progress lines are emitted per job and per poll; only echo them where
+        # debug output was asked for instead of writing each one to stdout
+        _log.debug(message)
+        # Opened on the first message and kept open; line buffered so each
+        # message reaches the file as soon as it is logged
+        if self._log_file is None:
+            self._log_file = open(self.log_path, "a", buffering=1)
+        self._log_file.write(log_message + "\n")
+
+    def close(self):
+        """Close the workflow log file, it is reopened by the next message."""
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        # Safety net for workflows dropped without close(); __init__ may not have run
+        if getattr(self, "_log_file", None) is not None:
+            self._log_file.close()
 
     @staticmethod
     def create(project_uuid, jobs, uuid=None, mode=None):
@@ -78,9 +225,8 @@ class VWorkflow(ABC):
         """
         if not mode:
             workflow_path = os.path.join(os.environ["HOME"], ".Yuki", "Workflows", uuid)
-            runner_id = metadata.ConfigFile(os.path.join(workflow_path, "config.json")).read_variable("machine_id", "")
-            config = metadata.ConfigFile(os.path.join(os.environ["HOME"], ".Yuki", "config.json"))
-            backend_types = config.read_variable("backend_types", {})
+            runner_id = CachedConfigFile(os.path.join(workflow_path, "config.json")).read_variable("machine_id", "")
+            backend_types = yuki_config().read_variable("backend_types", {})
             mode = backend_types.get(runner_id, "reana")
         if mode == "dry":
             from .dry_workflow import DryWorkflow
@@ -89,8 +235,16 @@ class VWorkflow(ABC):
             from .reana_workflow import ReanaWorkflow
             return ReanaWorkflow(project_uuid, jobs, uuid)
 
+    def _get_job(self, path, machine_id):
+        """Return the VJob for (path, machine_id), constructing it only once per workflow."""
+        key = (path, machine_id)
+        job = self._job_cache.get(key)
+        if job is None:
+            job = self._job_cache[key] = VJob(path, machine_id)
+        return job
+
     def get_name(self):
-        return f"w-{self.project_uuid[:8]}-{self.uuid[:8]}"
+        return self._name
 
     def run(self):
         """Common execution flow for workflows.
@@ -112,27 +266,23 @@ class VWorkflow(ABC):
 
         self.logger(f"Jobs after the construction: {self.jobs}")
 
-        # Set all the jobs to be the waiting status
-        total_jobs = len(self.jobs)
-        for i, job in enumerate(self.jobs):
-            self.logger(f"[{i+1}/{total_jobs}] job: {job}, is input: {job.is_input}, job status: {job.status()}, job type: {job.job_type()}")
-
         # Save the jobs info to the config file
+        total_jobs = len(self.jobs)
         jobs_info = {}
-        for job in self.jobs:
+        for i, job in enumerate(self.jobs):
+            job_status = job.status()
+            job_type = job.job_type()
+            self.logger(f"[{i+1}/{total_jobs}] job: {job}, is input: {job.is_input}, job status: {job_status}, job type: {job_type}")
             jobs_info[job.uuid] = {
                 "is_input": job.is_input,
-                "job_type": job.job_type(),
-                "status": job.status(),
+                "job_type": job_type,
+                "status": job_status,
                 "workflow_id": job.workflow_id()
             }
         self.config_file.write_variable("jobs_info", jobs_info)
 
-        for job in self.jobs:
-            if job.is_input:
-                continue
-            if job.job_type() == "algorithm":
-                continue
+        active_jobs = self._active_jobs()
+        for job in active_jobs:
             job.set_status("waiting")
 
         # Wait for dependencies
@@ -140,7 +290,6 @@ class VWorkflow(ABC):
             return
 
         # Set workflow IDs for jobs
-        active_jobs = [j for j in self.jobs if not j.is_input and j.job_type() != "algorithm"]
         total_active = len(active_jobs)
         for i, job in enumerate(active_jobs):
             self.logger(f"[{i+1}/{total_active}] Set workflow id to job {job}")
@@ -155,12 +304,7 @@ class VWorkflow(ABC):
         except:
             self.logger("Failed to construct the snakefile")
             self.set_workflow_status("failed")
-            for job in self.jobs:
-                if job.is_input:
-                    continue
-                if job.job_type() == "algorithm":
-                    continue
-                job.set_status("failed")
+            self._set_active_jobs_status("failed", active_jobs)
             raise
 
         try:
@@ -169,14 +313,29 @@ class VWorkflow(ABC):
         except:
             self.logger("Failed to execute backend")
             self.set_workflow_status("failed")
-            for job in self.jobs:
-                if job.is_input:
-                    continue
-                if job.job_type() == "algorithm":
-                    continue
-                job.set_status("failed")
+            self._set_active_jobs_status("failed", active_jobs)
             raise
 
+    def _active_jobs(self):
+        """Return the jobs run by this workflow, i.e. neither inputs nor algorithms."""
+        return [job for job in self.jobs if not job.is_input and job.job_type() != "algorithm"]
+
+    def _set_active_jobs_status(self, status, active_jobs=None):
+        """Set the status of the jobs run by this workflow.
+
+        Each job keeps its status in its own status.json, so jobs already in the
+        requested status are skipped instead of rewriting their file.
+
+        Args:
+            status (str): New status of the jobs
+            active_jobs (list): The jobs from _active_jobs(), if the caller has them
+        """
+        if active_jobs is None:
+            active_jobs = self._active_jobs()
+        for job in active_jobs:
+            if job.status_file.read_variable("status") != status:
+                job.set_status(status)
+
     @abstractmethod
     def _execute_backend(self):
         pass
@@ -190,72 +349,110 @@ class VWorkflow(ABC):
 
         Notes:
         - Polls the statuses of workflows referred to by input jobs.
-        - Uses a bounded number of retries to avoid infinite wait.
+        - Polls with exponential backoff within a bounded time window to avoid infinite wait.
         - If dependencies do not finish within the retry window, resets job states and returns False.
+        - If a dependency failed, stops waiting at once, marks the workflow failed,
+          resets job states and returns False.
         """
-        # First, check whether the dependencies are satisfied
-        for iTries in range(60):
-            self.logger(f"Checking finished (Attempt {iTries+1}/60)")
-            all_finished = True
-            workflow_list = []
-            input_jobs = [j for j in self.jobs if j.is_input and j.status() not in ("archived", "finished") and j.job_type() != "algorithm"]
-            total_inputs = len(input_jobs)
-
-            for i, job in enumerate(input_jobs):
-                workflow = VWorkflow.create(self.project_uuid, [], job.workflow_id())
-                self.logger(f"[{i+1}/{total_inputs}] Checking dependency: Job {job.uuid} workflow {workflow.uuid}")
-                if workflow and workflow not in workflow_list:
-                    workflow_list.append(workflow)
-                # FIXME: may check if some of the dependence fail
-
-            for workflow in workflow_list:
-                workflow.update_workflow_status()
-
-            for i, job in enumerate(self.jobs):
-                if not job.is_input:
-                    continue
-                if job.status() == "archived":
-                    continue
-                if job.status() == "finished":
-                    continue
-                if job.job_type() == "algorithm":
-                    continue
-                workflow = VWorkflow.create(self.project_uuid, [], job.workflow_id())
-                if workflow in workflow_list:
-                    job.update_status_from_workflow(
-                        os.path.join(
-                            os.environ["HOME"],
-                            ".Yuki",
-                            "Workflows",
-                            self.project_uuid,
-                            job.workflow_id()
-                            ),
-                        self.logger
-                        )
-
+        # Input jobs still waiting for their upstream workflows; finished ones are
+        # dropped so each attempt only polls what is left
+        pending = {
+            job.uuid: job for job in self.jobs
+            if job.is_input and job.status() not in ("archived", "finished")
+            and job.job_type() != "algorithm"
+        }
+        # Upstream workflows keyed by uuid, created once for all attempts
+        workflows = {}
+        # Results stamp of each job's workflow when the job was last synced
+        synced = {}
+        # Input jobs whose upstream workflow failed
+        failed = set()
+        deadline = time.time() + _DEPENDENCY_TIMEOUT
+        delay = 1.0
+        attempt = 0
+        while True:
+            attempt += 1
+            self.logger(f"Checking finished (Attempt {attempt})")
+            # Workflows of the pending jobs, each refreshed once per attempt
+            workflow_map = {}
+            # (job uuid, job, workflow path) of the pending jobs, synced after the refresh
+            checks = []
+            total_inputs = len(pending)
+
+            for i, (job_uuid, job) in enumerate(pending.items()):
+                wf_uuid = job.workflow_id()
+                if wf_uuid not in workflow_map:
+                    if wf_uuid not in workflows:
+                        workflows[wf_uuid] = VWorkflow.create(self.project_uuid, [], wf_uuid)
+                    workflow_map[wf_uuid] = workflows[wf_uuid]
+                checks.append((job_uuid, job, os.path.join(self._workflow_prefix, wf_uuid)))
+                self.logger(f"[{i+1}/{total_inputs}] Checking dependency: Job {job.uuid} workflow {wf_uuid}")
+
+            # All workflows are refreshed before any job is synced, so the
+            # backends are polled concurrently
+            self._refresh_workflows(workflow_map.values())
+
+            for job_uuid, job, workflow_path in checks:
+                # Sync the job only when its workflow wrote new results since the last sync
+                stamp = _results_stamp(workflow_path)
+                if synced.get(job_uuid) != stamp:
+                    synced[job_uuid] = stamp
+                    job.update_status_from_workflow(workflow_path, self.logger)
                 job_status = job.status()
-                # self.logger(f"Job {job.short_uuid()} status: {job_status}")
-                if job_status != "finished":
-                    all_finished = False
-                    # We continue checking other jobs to update their status as well
-
-            if all_finished:
+                if job_status == "finished":
+                    del pending[job_uuid]
+                elif job_status == "failed":
+                    failed.add(job_uuid)
+
+            all_finished = not pending
+            # A failed dependency will not finish, there is no point in waiting
+            if all_finished or failed:
+                break
+            remaining = deadline - time.time()
+            if remaining <= 0:
                 break
-            time.sleep(10)
+            # Back off gradually: short dependencies are picked up within seconds
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 1.5, _MAX_POLL_INTERVAL)
+        for workflow in workflows.values():
+            workflow.close()
         self.logger("All done")
 
         if not all_finished:
-            for job in self.jobs:
-                if job.is_input:
-                    continue
-                if job.job_type() == "algorithm":
-                    continue
-                job.set_status("raw")
-            self.logger("Some dependencies are not finished yet.")
+            self._set_active_jobs_status("raw")
+            if failed:
+                self.logger(f"Dependencies failed: {sorted(failed)}")
+                self.set_workflow_status("failed")
+            else:
+                self.logger("Some dependencies are not finished yet.")
             return False
 
         return True
 
+    def _refresh_workflows(self, workflows):
+        """Refresh the status of several workflows, polling each backend concurrently.
+
+        The REANA client is configured through the process-wide REANA_SERVER_URL,
+        so only workflows on the same machine are polled at the same time.
+        Workflows refreshed by this waiter within the last second are skipped,
+        like the status cache in status().
+        """
+        now = time.time()
+        by_machine = {}
+        for workflow in workflows:
+            if now - self._status_ttl.get(workflow.uuid, 0) < _REFRESH_TTL:
+                continue
+            self._status_ttl[workflow.uuid] = now
+            by_machine.setdefault(workflow.machine_id, []).append(workflow)
+
+        for group in by_machine.values():
+            if len(group) == 1:
+                group[0].update_workflow_status()
+                continue
+            with ThreadPoolExecutor(max_workers=min(len(group), _MAX_STATUS_POLLS)) as executor:
+                # update_workflow_status logs and swallows its own errors
+                list(executor.map(lambda workflow: workflow.update_workflow_status(), group))
+
     def construct_snake_file(self):
         """Construct the Snakemake Snakefile describing rules for all jobs.
 
@@ -264,8 +461,7 @@ class VWorkflow(ABC):
         - References a container image and resources.
         - Provides a shell command combining the job's commands.
         """
-        config = metadata.ConfigFile(os.path.join(os.environ["HOME"], ".Yuki", "config.json"))
-        use_kerberos = config.read_variable("use_kerberos", {}).get(self.machine_id, False)
+        use_kerberos = yuki_config().read_variable("use_kerberos", {}).get(self.machine_id, False)
         for job in self.jobs:
             self.logger(f"Job in the workflow: {job}, is input: {job.is_input}, job type: {job.job_type()}")
 
@@ -275,122 +471,64 @@ class VWorkflow(ABC):
         self.dependencies = {}
         self.steps = []
 
-        snake_file.addline("rule all:", 0)
-        snake_file.addline("input:", 1)
-        self.dependencies["all"] = []
-        snake_file.addline(f'"finalize.done",', 2)
-        self.dependencies["all"].append("finalize")
+        snake_file.addtext(_ALL_RULE)
+        self.dependencies["all"] = ["finalize"]
 
+        # Inputs staged on this machine's EOS are copied in by setup and back by finalize
         setup_commands = []
-        for job in self.jobs:
-            if job.object_type() == "task" and job.is_input:
-                if not job.use_eos() or job.machine_id != self.machine_id:
-                    continue
-                container = ContainerJob(job.path, job.machine_id)
-                setup_commands.extend(container.setup_commands())
-
         finalize_commands = []
         for job in self.jobs:
             if job.object_type() == "task" and job.is_input:
                 if not job.use_eos() or job.machine_id != self.machine_id:
                     continue
                 container = ContainerJob(job.path, job.machine_id)
+                setup_commands.extend(container.setup_commands())
                 finalize_commands.extend(container.finalize_commands())
 
-        snake_file.addline("\n", 0)
-        snake_file.addline("rule setup:", 0)
-        snake_file.addline("input:", 1)
-        snake_file.addline("output:", 1)
-        snake_file.addline(f'"setup.done",', 2)
-        snake_file.addline("container:", 1)
-        snake_file.addline(f'"docker://docker.io/reanahub/reana-env-root6:6.18.04"', 2)
-        snake_file.addline("resources:", 1)
-        if setup_commands and use_kerberos:
-            snake_file.addline(f'kerberos=True,', 2)
-        snake_file.addline(f'kubernetes_memory_limit="1Gi"', 2)
-        snake_file.addline("shell:", 1)
-        if setup_commands:
-            snake_file.addline(f'"{" && ".join(setup_commands)} && touch setup.done"', 2)
-        else:
-            snake_file.addline(f'"touch setup.done"', 2)
+        snake_file.addtext(_STAGING_RULE.format(
+            name="setup",
+            inputs="",
+            output='"setup.done",',
+            resources=_KERBEROS_RESOURCES if setup_commands and use_kerberos else "",
+            commands=" && ".join(setup_commands + ["touch setup.done"]),
+        ))
         self.dependencies["setup"] = []
 
-        snake_file.addline("\n", 0)
-        snake_file.addline("rule finalize:", 0)
-        snake_file.addline("input:", 1)
-        self.dependencies["finalize"] = []
-        for job in self.jobs:
-            snake_file.addline(f'"{job.short_uuid()}.done",', 2)
-            self.dependencies["finalize"].append(f"step{job.short_uuid()}")
-
-        snake_file.addline("output:", 1)
-        snake_file.addline(f'"finalize.done"', 2)
-        snake_file.addline("container:", 1)
-        snake_file.addline(f'"docker://docker.io/reanahub/reana-env-root6:6.18.04"', 2)
-        snake_file.addline("resources:", 1)
-        snake_file.addline(f'kubernetes_memory_limit="1Gi"', 2)
-        snake_file.addline("shell:", 1)
-        if finalize_commands:
-            snake_file.addline(f'"{" && ".join(finalize_commands)} && touch finalize.done"', 2)
-        else:
-            snake_file.addline(f'"touch finalize.done"', 2)
+        # Rule name of each job, in the order of self.jobs
+        rule_names = [f"step{job.short_uuid()}" for job in self.jobs]
+        self.dependencies["finalize"] = rule_names.copy()
+        snake_file.addtext(_STAGING_RULE.format(
+            name="finalize",
+            inputs="".join(f'        "{job.short_uuid()}.done",\n' for job in self.jobs),
+            output='"finalize.done"',
+            resources="",
+            commands=" && ".join(finalize_commands + ["touch finalize.done"]),
+        ))
 
         total_jobs = len(self.jobs)
-        for i, job in enumerate(self.jobs):
+        for i, (job, rule_name) in enumerate(zip(self.jobs, rule_names)):
             start_time = time.time()
             self.logger(f"[{i+1}/{total_jobs}] Processing job: {job}")
-            if job.object_type() == "algorithm":
-                # In this case, if the command is compile, we need to compile it
-                image = ImageJob(job.path, job.machine_id)
-                image.is_input = job.is_input
-                snakemake_rule = image.snakemake_rule(self.machine_id)
-                step = image.step(self.machine_id)
-
-                # In this case, we also need to run the "touch"
-            if job.object_type() == "task":
-                container = ContainerJob(job.path, job.machine_id)
-                container.is_input = job.is_input
-                snakemake_rule = container.snakemake_rule(self.machine_id)
-                step = container.step(self.machine_id)
+            snakemake_rule, step = self._job_rule(job)
             self.logger(f"[{i+1}/{total_jobs}] Get the step at time {time.time() - start_time:.4f}s")
 
-            snake_file.addline("\n", 0)
-            snake_file.addline(f"rule step{job.short_uuid()}:", 0)
-            snake_file.addline("input:", 1)
-            for input_file in snakemake_rule["inputs"]:
-                snake_file.addline(f'"{input_file}",', 2)
             # Add the dependencies
-            self.dependencies[f"step{job.short_uuid()}"] = []
-            for dep in job.dependencies():
-                dep_job = VJob(
-                    os.path.join(
-                        os.environ["HOME"],
-                        ".Yuki",
-                        "Storage",
-                        self.project_uuid,
-                        dep
-                    ),
-                    self.machine_id
-                )
-                self.dependencies[f"step{job.short_uuid()}"].append(f"step{dep_job.short_uuid()}")
+            # The short uuid of a dependency is the first 7 characters of its uuid
+            self.dependencies[rule_name] = [f"step{dep[:7]}" for dep in job.dependencies()]
             self.logger(f"[{i+1}/{total_jobs}] Added inputs and dependencies at time {time.time() - start_time:.4f}s")
 
-            snake_file.addline("output:", 1)
-            snake_file.addline(f'"{job.short_uuid()}.done"', 2)
-            snake_file.addline("container:", 1)
-            snake_file.addline(f'"docker://{snakemake_rule["environment"]}"', 2)
-            snake_file.addline("resources:", 1)
-            compute_backend = snakemake_rule["compute_backend"]
-            if job.use_eos() and use_kerberos:
-                snake_file.addline(f'kerberos=True,', 2)
-            if compute_backend == "htcondorcern":
-                snake_file.addline(f'compute_backend="{snakemake_rule["compute_backend"]}",', 2)
-                snake_file.addline(f'htcondor_max_runtime="espresso",', 2)
-                snake_file.addline(f'kerberos=True,', 2)
+            resources = _KERBEROS_RESOURCES if job.use_eos() and use_kerberos else ""
+            if snakemake_rule["compute_backend"] == "htcondorcern":
+                resources += _HTCONDOR_RESOURCES
             else:
-                snake_file.addline(f'kubernetes_memory_limit="{snakemake_rule["memory"]}"', 2)
-            snake_file.addline("shell:", 1)
-            snake_file.addline(f'"{" && ".join(snakemake_rule["commands"])}"', 2)
+                resources += _KUBERNETES_RESOURCES.format(memory=snakemake_rule["memory"])
+            snake_file.addtext(_STEP_RULE.format(
+                short_uuid=job.short_uuid(),
+                inputs="".join(f'        "{input_file}",\n' for input_file in snakemake_rule["inputs"]),
+                environment=snakemake_rule["environment"],
+                resources=resources,
+                commands=" && ".join(snakemake_rule["commands"]),
+            ))
             self.logger(f"[{i+1}/{total_jobs}] Added shell and resources at time {time.time() - start_time:.4f}s")
 
             self.steps.append(step)
@@ -399,57 +537,92 @@ class VWorkflow(ABC):
         snake_file.write()
         self.logger(f"Snakefile written to {self.snakefile_path}")
 
+    def _job_rule(self, job):
+        """Return the (snakemake_rule, step) pair of a job, memoized across workflows.
+
+        Impressions are immutable, so a job's rule only depends on its uuid and on
+        the per-run settings in the key; the memo lives for the worker process and
+        is never written to disk since the commands embed machine-specific paths.
+        The returned dicts are shared and must not be modified.
+        """
+        eos_mount_points = yuki_config().read_variable("eos_mount_point", {})
+        key = (job.path, job.object_type(), job.machine_id, self.machine_id, job.is_input,
+               job.use_eos(), job.use_kerberos(), eos_mount_points.get(self.machine_id))
+        cached = _RULE_MEMO.get(key)
+        if cached is not None:
+            return cached
+
+        if job.object_type() == "algorithm":
+            # In this case, if the command is compile, we need to compile it
+            rule_job = ImageJob(job.path, job.machine_id)
+        elif job.object_type() == "task":
+            rule_job = ContainerJob(job.path, job.machine_id)
+        else:
+            raise ValueError(f"Unknown object type of job {job}: {job.object_type()}")
+        rule_job.is_input = job.is_input
+        cached = (rule_job.snakemake_rule(self.machine_id), rule_job.step(self.machine_id))
+
+        if len(_RULE_MEMO) >= _MAX_RULE_MEMO:
+            _RULE_MEMO.clear()
+        _RULE_MEMO[key] = cached
+        return cached
+
     def construct_workflow_jobs(self, root_jobs):
         """
         Construct workflow jobs iteratively including dependencies (DAG-safe, no recursion).
 
         Implementation note:
-        - Uses an explicit stack for DFS-like traversal.
-        - Each stack entry is (VJob, expanded_flag). On first visit we push it back as expanded
-          and push its dependencies; on the second visit we append it to self.jobs.
+        - Depth-first post-order traversal with an explicit stack of frames.
+        - Each frame is (VJob, iterator over its remaining dependencies); a job is
+          appended to self.jobs once its iterator is exhausted, i.e. after all its
+          dependencies, so self.jobs is in dependency-first order.
+        - Jobs with a terminal status are appended on sight without expanding them.
         - This avoids recursion and handles DAGs safely.
         """
         visited = set()
-        # Initialize stack with all root jobs, marked as not expanded
-        stack = [(job, False) for job in root_jobs]
-
-        while stack:
-            job, expanded = stack.pop()
 
-            # Skip if already processed (only if first time)
-            if job.path in visited and not expanded:
-                continue
+        def enter(job):
+            """Return the job to expand, or None if it needs no expansion."""
+            if job.path in visited:
+                return None
 
             # Ensure job has machine_id
             if job.machine_id is None:
-                job = VJob(job.path, self.machine_id)
+                job = self._get_job(job.path, self.machine_id)
                 if job.machine_id is None:
-                    continue
-
-            status = job.status()
-            obj_type = job.object_type()
+                    return None
 
             # For terminal jobs, add immediately
-            if status in ("finished", "failed", "pending", "running", "archived"):
-                if obj_type == "task":
+            if job.status() in ("finished", "failed", "pending", "running", "archived"):
+                if job.object_type() == "task":
                     job.is_input = True
                 self.jobs.append(job)
                 visited.add(job.path)
-                continue
+                return None
+            return job
 
-            if expanded:
-                # Second time we pop the job: all dependencies are done
-                self.jobs.append(job)
-                visited.add(job.path)
+        # Roots are taken from the end, the last root job is walked first
+        for root in reversed(root_jobs):
+            job = enter(root)
+            if job is None:
                 continue
-
-            # Otherwise, expand dependencies first
-            stack.append((job, True))  # mark job to add after deps
-            for dep in job.dependencies():
-                dep_path = os.path.join(os.environ["HOME"], ".Yuki", "Storage", self.project_uuid, dep)
-                dep_job = VJob(dep_path, None)
-                if dep_job.path not in visited:
-                    stack.append((dep_job, False))
+            stack = [(job, reversed(job.dependencies()))]
+            while stack:
+                job, deps = stack[-1]
+                for dep in deps:
+                    dep_path = os.path.join(self._storage_prefix, dep)
+                    # Look the job up only for dependencies that still need a visit
+                    if dep_path in visited:
+                        continue
+                    dep_job = enter(self._get_job(dep_path, None))
+                    if dep_job is not None:
+                        stack.append((dep_job, reversed(dep_job.dependencies())))
+                        break
+                else:
+                    # All dependencies are done
+                    stack.pop()
+                    self.jobs.append(job)
+                    visited.add(job.path)
 
     def status(self):
         """Get the current workflow status."""
@@ -461,7 +634,7 @@ class VWorkflow(ABC):
         if not os.path.exists(path):
             return "unknown"
 
-        results_file = metadata.ConfigFile(path)
+        results_file = CachedConfigFile(path)
         results = results_file.read_variable("results", {})
         # print("Results:", results)
         try:
@@ -474,10 +647,7 @@ class VWorkflow(ABC):
 
     def set_workflow_status(self, status):
         path = os.path.join(self.path, "results.json")
-        results_file = metadata.ConfigFile(path)
-        results = results_file.read_variable("results", {})
-        results["status"] = status
-        results_file.write_variable("results", results) 
+        CachedConfigFile(path).update_variable("results", {"status": status})
                 
     def watermark(self, impression=None):
         """Add watermark to PNG images for a given impression.
@@ -491,7 +661,7 @@ class VWorkflow(ABC):
         """
         self.logger(f"Watermarking impression: {impression}")
         if impression:
-            path = os.path.join(os.environ["HOME"], ".Yuki", "Storage", self.project_uuid, impression, self.machine_id)
+            path = os.path.join(self._storage_prefix, impression, self.machine_id)
             if not os.path.exists(os.path.join(path, "stageout.downloaded")):
                 return False
             outputs_path = os.path.join(path, "stageout")
@@ -502,45 +672,19 @@ class VWorkflow(ABC):
             total_files = len(filelist)
             self.logger(f"Files to watermark: {filelist}")
 
-            # Water mark the png files
-            for i, filename in enumerate(filelist):
-                # 1. Open the image and convert it to RGBA.
-                # The watermark will be drawn directly onto this image object.
-                image = Image.open(os.path.join(outputs_path, filename)).convert("RGBA")
-
-                # 2. Create the drawing context directly on the image
-                draw = ImageDraw.Draw(image)
-
-                # --- Watermark Setup ---
-
-                # Use the same logic for sizing the font (using the original code's approach)
-                font_size = int(min(image.size) / 20)
-                try:
-                    font = ImageFont.truetype("arial.ttf", font_size)
-                except:
-                    font = ImageFont.load_default()
-
-                text = f"Imp:{impression}"
-                self.logger(f"Watermark text: {text}")
-
-                # Use the positioning logic from the original code (top-right corner)
-                textwidth = draw.textlength(text, font=font)
-
-                # The original code's positioning (using y=10)
-                x = image.size[0] - textwidth - 10
-                y = 10
-
-                # Define the color and opacity
-                # fill_color = (255, 255, 255, 50)
-                # fill_color = (255, 255, 255, 255)
-                fill_color = (0, 0, 0, 255)
-
-                # 3. Draw the text directly onto the image object
-                draw.text((x, y), text, font=font, fill=fill_color)
-
-                # 4. Save the resulting image.
-                image.save(os.path.join(watermark_path, f"imp{impression[:8]}_{filename}"), format="PNG")
-                self.logger(f"[{i+1}/{total_files}] Saved watermarked image: {filename}")
+            text = f"Imp:{impression}"
+            self.logger(f"Watermark text: {text}")
+
+            # Water mark the png files; Pillow releases the GIL while decoding
+            # and encoding, so the files are processed in parallel
+            sources = [os.path.join(outputs_path, filename) for filename in filelist]
+            targets = [os.path.join(watermark_path, f"imp{impression[:8]}_{filename}")
+                       for filename in filelist]
+            max_workers = min(total_files, os.cpu_count() or 1) or 1
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                saved = executor.map(_watermark_png, sources, targets, [text] * total_files)
+                for i, (filename, _) in enumerate(zip(filelist, saved)):
+                    self.logger(f"[{i+1}/{total_files}] Saved watermarked image: {filename}")
 
     @abstractmethod
     def update_workflow_status(self):
@@ -6,11 +6,29 @@ that extends VJob functionality with container-specific operations like
 environment management, command execution, and input/output handling.
 """
 import os
+import logging
 from CelebiChrono.utils import csys
-from CelebiChrono.utils import metadata
-from .vjob import VJob
+from .vjob import VJob, expand_placeholders
 from .image_job import ImageJob
-import time
+from ..utils.cached_metadata import yuki_config
+
+logger = logging.getLogger("YukiLogger")
+
+_UNSET = object()
+# Log redirection appended to each user command; "{{ }}" is the Snakefile
+# escaped form of the shell group "{ }" used in the REANA step.
+_REANA_COMMAND_SUFFIX = " ; } >> logs/celebi_user_step%d.log 2>&1"
+_SNAKEMAKE_COMMAND_SUFFIX = " ; }} >> logs/celebi_user_step%d.log 2>&1"
+
+
+def _load_eos_mount_points():
+    """
+    Get the EOS mount points from the Yuki configuration file.
+
+    Returns:
+        dict: Mapping from machine id to EOS mount point
+    """
+    return yuki_config().read_variable("eos_mount_point", {})
 
 class ContainerJob(VJob):
     """
@@ -28,7 +46,15 @@ class ContainerJob(VJob):
             path (str): Path to the container job
             machine_id (str): Identifier for the target machine
         """
-        self._image = None
+        self._image = _UNSET
+        self._image_short_uuid = None
+        self._inputs = None
+        self._alias_items_cache = None
+        self._alias_short_paths = None
+        self._alias_done_deps = None
+        self._parameters = None
+        self._substitutions = None
+        self._user_commands = None
         super().__init__(path, machine_id)
 
     def inputs(self):
@@ -38,8 +64,29 @@ class ContainerJob(VJob):
         Returns:
             tuple: A tuple containing (alias_keys, alias_to_impression_map)
         """
-        alias_to_imp = self.config_file.read_variable("alias_to_impression", {})
-        return (alias_to_imp.keys(), alias_to_imp)
+        if self._inputs is None:
+            alias_items = self._alias_items()
+            self._inputs = (tuple(alias for alias, _ in alias_items), dict(alias_items))
+        return self._inputs
+
+    def _alias_items(self):
+        """
+        Get the (alias, impression) pairs of the inputs, read once per job.
+
+        Returns:
+            tuple: Tuple of (alias, impression) pairs
+        """
+        if self._alias_items_cache is None:
+            alias_to_imp = self.config_file.read_variable("alias_to_impression", {})
+            self._alias_items_cache = tuple(alias_to_imp.items())
+            # Workspace paths and done markers of the inputs
+            self._alias_short_paths = {
+                alias: f"../imp{impression[:7]}" for alias, impression in self._alias_items_cache
+            }
+            self._alias_done_deps = tuple(
+                f"{impression[:7]}.done" for _, impression in self._alias_items_cache
+            )
+        return self._alias_items_cache
 
     def image(self):
         """
@@ -48,16 +95,15 @@ class ContainerJob(VJob):
         Returns:
             ImageJob or None: The image associated with predecessor algorithm jobs
         """
-        if self._image:
+        if self._image is not _UNSET:
             return self._image
-        start_time = time.time()
         predecessors = self.predecessors()
-        # print("Predecessors, ", self.predecessors())
         for pred_job in predecessors:
             if pred_job.job_type() == "algorithm":
-                print(f"    >>>> >>>> Image retrieval time after finding predecessor: {time.time() - start_time}")
                 self._image = ImageJob(pred_job.path, self.machine_id)
+                self._image_short_uuid = self._image.short_uuid()
                 return self._image
+        self._image = None
         return None
 
     def step(self, request_machine_id):
@@ -68,63 +114,63 @@ class ContainerJob(VJob):
             dict: A dictionary containing step configuration with commands,
                   environment, memory limits, and other execution parameters
         """
-        start_time = time.time()
-        commands = []
-        commands.extend(self._create_directory_commands())
-        # print(f"    >>>> Step creation time after directory commands: {time.time() - start_time}")
-        commands.extend(self._create_symlink_commands())
-        # print(f"    >>>> Step creation time after symlink commands: {time.time() - start_time}")
-        commands.extend(self._process_user_commands_for_reana())
-        # print(f"    >>>> Step creation time after user commands: {time.time() - start_time}")
-        # print("-------------")
-        # print("self.is_input", self.is_input)
-        # print("self.use_eos()", self.use_eos())
+        commands = [
+            *self._create_directory_commands(),
+            *self._create_symlink_commands(),
+            *self._wrap_commands("{ ", _REANA_COMMAND_SUFFIX),
+        ]
         if (not self.is_input) and self.use_eos():
-            # print("Using EOS for stageout")
-            config_path = os.path.join(os.environ["HOME"], ".Yuki", "config.json")
-            eos_mount_points = metadata.ConfigFile(config_path).read_variable("eos_mount_point", {})
-            eos_path = eos_mount_points.get(request_machine_id, "/eos/user/unknown")
-            commands.append("mkdir -p " + eos_path + f"/{self.project_uuid}/{self.impression()}/")
-            commands.append("cp -r stageout/* " + eos_path + f"/{self.project_uuid}/{self.impression()}/")
+            logger.debug("Using EOS for stageout")
+            eos_target = self._eos_target(request_machine_id)
+            commands.append(f"mkdir -p {eos_target}/")
+            commands.append(f"cp -r stageout/* {eos_target}/")
         commands.append("cd ..")
         commands.append(f"touch {self.short_uuid()}.done")
 
         step = self._create_reana_step_metadata()
-        print(f"    >>>> Step creation time after metadata creation: {time.time() - start_time}")
         # step["commands"] = " && ".join(commands)
         step["commands"] = commands
 
         return step
 
-    def _process_user_commands_for_reana(self):
+    def _substituted_commands(self):
         """
-        Process and prepare user-defined commands for REANA execution.
+        Get the user-defined commands with placeholders substituted.
+
+        The result is shared by the REANA and Snakemake command builders so
+        the substitution runs once per job.
 
         Returns:
-            list: List of processed commands ready for REANA execution
+            tuple: Substituted commands with double quotes escaped
         """
-        start_time = time.time()
-        if self.is_input or self.compute_backend() == "htcondorcern":
-            return []
+        if self._user_commands is not None:
+            return self._user_commands
 
-        print(f"    >>>> >>>> User command processing start time: {time.time() - start_time}")
+        if self.is_input or self.compute_backend() == "htcondorcern":
+            self._user_commands = ()
+            return self._user_commands
 
         raw_commands = self.image().yaml_file.read_variable("commands", [])
-        processed_commands = []
-
-        print(raw_commands)
-        for i, command in enumerate(raw_commands):
-            print(f"    >>>> >>>> Processing command {i} start time: {time.time() - start_time}")
-            command = self._substitute_parameters(command)
-            print(f"    >>>> >>>> After parameter substitution time: {time.time() - start_time}")
-            command = self._substitute_inputs(command)
-            print(f"    >>>> >>>> After input substitution time: {time.time() - start_time}")
-            command = self._substitute_paths(command)
-            print(f"    >>>> >>>> After path substitution time: {time.time() - start_time}")
-            command = f"{{ " + command + f" ; }} >> logs/celebi_user_step{i}.log 2>&1"
-            processed_commands.append(command.replace("\"", "\\\""))
-
-        return processed_commands
+        logger.debug("Raw user commands: %s", raw_commands)
+        self._user_commands = tuple(
+            self._substitute(command).replace("\"", "\\\"")
+            for command in raw_commands
+        )
+        return self._user_commands
+
+    def _wrap_commands(self, open_brace, suffix):
+        """
+        Wrap the user-defined commands so their output goes to the step logs.
+
+        Args:
+            open_brace (str): Opening brace of the command group
+            suffix (str): Format string closing the group, taking the step index
+
+        Yields:
+            str: Wrapped commands ready for execution
+        """
+        for i, command in enumerate(self._substituted_commands()):
+            yield open_brace + command + suffix % i
 
     def _create_reana_step_metadata(self):
         """
@@ -172,17 +218,16 @@ class ContainerJob(VJob):
             dict: A dictionary containing rule configuration including commands,
                   environment, memory, inputs, and outputs for Snakemake workflow
         """
-        commands = []
-        commands.extend(self._create_directory_commands())
-        commands.extend(self._create_symlink_commands())
-        commands.extend(self._process_user_commands())
+        commands = [
+            *self._create_directory_commands(),
+            *self._create_symlink_commands(),
+            *self._wrap_commands("{{ ", _SNAKEMAKE_COMMAND_SUFFIX),
+        ]
         if (not self.is_input) and self.use_eos():
-            print("Using EOS for stageout")
-            config_path = os.path.join(os.environ["HOME"], ".Yuki", "config.json")
-            eos_mount_points = metadata.ConfigFile(config_path).read_variable("eos_mount_point", {})
-            eos_path = eos_mount_points.get(request_machine_id, "/eos/user/unknown")
-            commands.append("mkdir -p " + eos_path + f"/{self.project_uuid}/{self.impression()}/")
-            commands.append("cp -r stageout/* " + eos_path + f"/{self.project_uuid}/{self.impression()}/")
+            logger.debug("Using EOS for stageout")
+            eos_target = self._eos_target(request_machine_id)
+            commands.append(f"mkdir -p {eos_target}/")
+            commands.append(f"cp -r stageout/* {eos_target}/")
         commands.append("cd ..")
         commands.append(f"touch {self.short_uuid()}.done")
 
@@ -196,114 +241,82 @@ class ContainerJob(VJob):
         """
         Create commands for setting up required directories.
 
-        Returns:
-            list: List of directory setup commands
+        Yields:
+            str: Directory setup commands
         """
-        return [
-            f"mkdir -p imp{self.short_uuid()}/stageout",
-            f"mkdir -p imp{self.short_uuid()}/logs",
-            f"cd imp{self.short_uuid()}"
-        ]
+        short_uuid = self.short_uuid()
+        yield f"mkdir -p imp{short_uuid}/stageout"
+        yield f"mkdir -p imp{short_uuid}/logs"
+        yield f"cd imp{short_uuid}"
 
     def _create_symlink_commands(self):
         """
         Create symbolic link commands for code and inputs.
 
-        Returns:
-            list: List of symlink commands
+        Yields:
+            str: Symlink commands
         """
-        commands = []
-
         # Link to code directory if image exists
-        image = self.image()
-        if image:
-            commands.append(f"ln -s ../imp{image.short_uuid()} code")
+        if self.image():
+            yield f"ln -s ../imp{self._image_short_uuid} code"
 
         # Link to input impressions
-        start_time = time.time()
-        alias_list, alias_map = self.inputs()
-        print(f"    >>>> >>>> Symlink creation time after inputs retrieval: {time.time() - start_time}")
-        print("The alias_list is:", alias_list)
-        for alias in alias_list:
-            impression = alias_map[alias]
-            commands.append(f"ln -s ../imp{impression[:7]} {alias}")
-
-        return commands
+        self._alias_items()
+        logger.debug("Input aliases: %s", self._alias_short_paths)
+        for alias, short_path in self._alias_short_paths.items():
+            yield f"ln -s {short_path} {alias}"
 
-    def _process_user_commands(self):
+    def _substitution_map(self):
         """
-        Process and prepare user-defined commands with parameter substitution.
+        Build the placeholder substitution table used for user commands.
+
+        Parameters take precedence over input aliases, which take precedence
+        over the workspace, output and code paths. Parameters are substituted
+        in sorted order ahead of the inputs and paths, so a parameter value is
+        itself expanded with the parameters after it, the input aliases and
+        the paths, e.g. "outdir: ${output}/plots".
 
         Returns:
-            list: List of processed commands ready for execution
+            dict: Mapping from placeholder name to its replacement value
         """
-        if self.is_input or self.compute_backend() == "htcondorcern":
-            return []
-
-        raw_commands = self.image().yaml_file.read_variable("commands", [])
-        processed_commands = []
+        if self._substitutions is not None:
+            return self._substitutions
 
-        for i, command in enumerate(raw_commands):
-            command = self._substitute_parameters(command)
-            command = self._substitute_inputs(command)
-            command = self._substitute_paths(command)
-            command = f"{{{{ " + command + f" ; }}}} >> logs/celebi_user_step{i}.log 2>&1"
-            processed_commands.append(command.replace("\"", "\\\""))
-
-        return processed_commands
+        substitutions = {
+            "workspace": "..",
+            "output": f"imp{self.short_uuid()}",
+        }
+        if self.image():
+            substitutions["code"] = f"../imp{self._image_short_uuid}"
 
-    def _substitute_parameters(self, command):
-        """
-        Replace parameter placeholders in command with actual values.
+        self._alias_items()
+        substitutions.update(self._alias_short_paths)
 
-        Args:
-            command (str): Command string with parameter placeholders
-
-        Returns:
-            str: Command with parameters substituted
-        """
         parameters, values = self.parameters()
-        for parameter in parameters:
+        for parameter in reversed(parameters):
             value = values[parameter]
-            placeholder = "${" + parameter + "}"
-            command = command.replace(placeholder, value)
-        return command
+            if isinstance(value, str):
+                value = expand_placeholders(value, substitutions)
+            substitutions[parameter] = value
 
-    def _substitute_inputs(self, command):
-        """
-        Replace input alias placeholders in command with impression paths.
-
-        Args:
-            command (str): Command string with input placeholders
+        self._substitutions = substitutions
+        return substitutions
 
-        Returns:
-            str: Command with inputs substituted
+    def _substitute(self, command):
         """
-        alias_list, alias_map = self.inputs()
-        for alias in alias_list:
-            impression = alias_map[alias]
-            placeholder = "${" + alias + "}"
-            command = command.replace(placeholder, f"../imp{impression[:7]}")
-        return command
+        Replace all ${...} placeholders in command in a single pass.
 
-    def _substitute_paths(self, command):
-        """
-        Replace workspace and code path placeholders in command.
+        Unknown placeholders are left untouched.
 
         Args:
-            command (str): Command string with path placeholders
+            command (str): Command string with placeholders
 
         Returns:
-            str: Command with paths substituted
+            str: Command with placeholders substituted
         """
-        command = command.replace("${workspace}", "..")
-        command = command.replace("${output}", f"imp{self.short_uuid()}")
-
-        image = self.image()
-        if image:
-            command = command.replace("${code}", f"../imp{image.short_uuid()}")
-
-        return command
+        if "${" not in command:
+            return command
+        return expand_placeholders(command, self._substitution_map())
 
     def _create_step_metadata(self):
         """
@@ -314,13 +327,14 @@ class ContainerJob(VJob):
         """
         environment = self.default_environment() if self.is_input else self.environment()
         compute_backend = self.compute_backend()
+        short_uuid = self.short_uuid()
 
         step = {
             "environment": environment,
             "memory": self.memory(),
             "compute_backend": compute_backend if compute_backend != "unsigned" else None,
-            "name": f"step{self.short_uuid()}",
-            "output": f"{self.short_uuid()}.done"
+            "name": f"step{short_uuid}",
+            "output": f"{short_uuid}.done"
         }
 
         return step
@@ -338,27 +352,36 @@ class ContainerJob(VJob):
         inputs = ["setup.done"]
 
         # Add input impression dependencies
-        alias_list, alias_map = self.inputs()
-        for alias in alias_list:
-            impression = alias_map[alias]
-            inputs.append(f"{impression[:7]}.done")
+        self._alias_items()
+        inputs.extend(self._alias_done_deps)
 
         # Add image dependency
-        image = self.image()
-        if image:
-            inputs.append(f"{image.short_uuid()}.done")
+        if self.image():
+            inputs.append(f"{self._image_short_uuid}.done")
 
         return inputs
 
     def setup_commands(self):
-        config_path = os.path.join(os.environ["HOME"], ".Yuki", "config.json")
-        eos_mount_points = metadata.ConfigFile(config_path).read_variable("eos_mount_point", {})
-        eos_path = eos_mount_points.get(self.machine_id, "/eos/user/unknown")
+        eos_target = self._eos_target(self.machine_id)
+        short_uuid = self.short_uuid()
         commands = []
-        commands.append(f"mkdir -p imp{self.short_uuid()}/stageout")
-        commands.append(f"cp -r {eos_path}/{self.project_uuid}/{self.impression()}/* imp{self.short_uuid()}/stageout/")
+        commands.append(f"mkdir -p imp{short_uuid}/stageout")
+        commands.append(f"cp -r {eos_target}/* imp{short_uuid}/stageout/")
         return commands
 
+    def _eos_target(self, machine_id):
+        """
+        Get the EOS directory holding the outputs of this impression.
+
+        Args:
+            machine_id (str): Machine whose EOS mount point is used
+
+        Returns:
+            str: EOS directory path, without a trailing slash
+        """
+        eos_path = _load_eos_mount_points().get(machine_id, "/eos/user/unknown")
+        return f"{eos_path}/{self.project_uuid}/{self.impression()}"
+
     def finalize_commands(self):
         commands = []
         commands.append(f"rm -rf imp{self.short_uuid()}/stageout")
@@ -371,7 +394,9 @@ class ContainerJob(VJob):
         Returns:
             str: Environment specification from YAML configuration
         """
-        return self.yaml_file.read_variable("environment", "")
+        if self._environment is None:
+            self._environment = self.yaml_file.read_variable("environment", "")
+        return self._environment
 
     def memory(self):
         """
@@ -401,11 +426,12 @@ class ContainerJob(VJob):
         Returns:
             tuple: A tuple containing (sorted_parameter_keys, parameters_dict)
         """
-        start_time = time.time()
+        if self._parameters is not None:
+            return self._parameters
         parameters = self.yaml_file.read_variable("parameters", {})
-        sorted_keys = sorted(parameters.keys())
-        print(f"    >>>> >>>> Parameters retrieval time: {time.time() - start_time}")
-        return sorted_keys, parameters
+        sorted_keys = sorted(parameters)
+        self._parameters = (sorted_keys, parameters)
+        return self._parameters
 
     def outputs(self):
         """
@@ -418,7 +444,7 @@ class ContainerJob(VJob):
             path = os.path.join(self.path, "rawdata")
             return csys.list_dir(path)
         path = os.path.join(self.path, self.machine_id, "stageout")
-        if not os.path.exists(path):
+        try:
+            return csys.list_dir(path)
+        except FileNotFoundError:
             return []
-        dirs = csys.list_dir(path)
-        return dirs
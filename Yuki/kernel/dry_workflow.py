@@ -6,10 +6,117 @@ by copying files to a local directory for manual/local execution instead of
 submitting to a remote REANA server.
 """
 import os
+import errno
 import shutil
 import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from .vworkflow import VWorkflow
-from CelebiChrono.utils import metadata
+from ..utils.cached_metadata import CachedConfigFile
+
+_log = logging.getLogger("YukiLogger")
+
+# Upper bound on concurrent file copies of the local workflow
+_MAX_COPY_WORKERS = 32
+# Every how many copies a progress line goes to the workflow log
+_COPY_LOG_EVERY = 100
+# Errors of os.copy_file_range meaning "copy the usual way instead"
+_COPY_FILE_RANGE_UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EPERM)
+
+
+def _copy_file(src, dst):
+    """
+    Copy the contents and metadata of src to dst, like shutil.copy2.
+
+    os.copy_file_range lets the filesystem share extents or copy server-side
+    (reflinks, NFS 4.2) instead of streaming the data through the kernel.
+    Falls back to shutil.copyfile where it is unavailable or unsupported,
+    including filesystems that report a short copy without an error.
+    """
+    if not _copy_file_range(src, dst):
+        shutil.copyfile(src, dst)
+    shutil.copystat(src, dst)
+
+
+def _copy_file_range(src, dst):
+    """
+    Copy the contents of src to dst with os.copy_file_range.
+
+    Some kernels (5.3 to 5.18) and FUSE filesystems return 0 before the end
+    of the file instead of failing, so the copied size is checked against
+    the source, as shutil does.
+
+    Returns:
+        bool: Whether dst now holds all of src
+    """
+    if not hasattr(os, "copy_file_range"):
+        return False
+    try:
+        with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            copied = 0
+            while True:
+                count = os.copy_file_range(fsrc.fileno(), fdst.fileno(), 1 << 30)
+                if not count:
+                    break
+                copied += count
+    except OSError as e:
+        # e.g. EXDEV across filesystems on older kernels, ENOSYS, EINVAL
+        if e.errno not in _COPY_FILE_RANGE_UNSUPPORTED:
+            raise
+        return False
+    return copied == size
+
+
+def _copy_if_changed(src, dst):
+    """
+    Copy src to dst unless dst already holds an up-to-date copy.
+
+    The copy keeps the modification time, so a destination with the same
+    size and a modification time not older than the source is left alone.
+
+    Returns:
+        bool: Whether the file was copied, or None if src does not exist
+    """
+    try:
+        src_stat = os.stat(src)
+    except FileNotFoundError:
+        return None
+    try:
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        pass
+    else:
+        if dst_stat.st_size == src_stat.st_size and dst_stat.st_mtime_ns >= src_stat.st_mtime_ns:
+            return False
+    _copy_file(src, dst)
+    return True
+
+
+def _scan_tree(src_path, dst_path):
+    """
+    List the files under src_path, creating their directories under dst_path.
+
+    Raises:
+        FileNotFoundError: If src_path does not exist
+
+    Returns:
+        list: (source, destination, name relative to src_path) of each file
+    """
+    with os.scandir(src_path) as it:
+        entries = list(it)
+    os.makedirs(dst_path, exist_ok=True)
+    files = []
+    for entry in entries:
+        dst = os.path.join(dst_path, entry.name)
+        if entry.is_dir():
+            files.extend(
+                (src, dst_file, f"{entry.name}/{name}")
+                for src, dst_file, name in _scan_tree(entry.path, dst)
+            )
+        else:
+            files.append((entry.path, dst, entry.name))
+    return files
 
 
 class DryWorkflow(VWorkflow):
@@ -19,15 +126,16 @@ class DryWorkflow(VWorkflow):
         """Initialize local workflow."""
         super().__init__(project_uuid, jobs, uuid)
         # Create a local execution directory
-        self.local_exec_path = os.path.join(
-                os.path.join(
-                    os.environ["HOME"],
-                    ".Yuki",
-                    "LocalWorkflows",
-                    self.uuid,
-                    )
-                )
-        os.makedirs(self.local_exec_path, exist_ok=True)
+        self.local_exec_path = os.path.join(self._yuki_home, "LocalWorkflows", self.uuid)
+        # A single mkdir in the common case where LocalWorkflows already exists
+        try:
+            os.mkdir(self.local_exec_path)
+        except FileExistsError:
+            pass
+        except FileNotFoundError:
+            os.makedirs(self.local_exec_path, exist_ok=True)
+        # Short uuids of the steps written to workflow_info.json by this instance
+        self._step_uuids = None
 
     def _execute_backend(self):
         """Execute workflow using local backend (copy files locally)."""
@@ -37,12 +145,7 @@ class DryWorkflow(VWorkflow):
         except Exception as e:
             self.logger(f"[LOCAL] Failed to create workflow structure: {e}")
             self.set_workflow_status("failed")
-            for job in self.jobs:
-                if job.is_input:
-                    continue
-                if job.job_type() == "algorithm":
-                    continue
-                job.set_status("failed")
+            self._set_active_jobs_status("failed")
             raise
 
         try:
@@ -51,12 +154,7 @@ class DryWorkflow(VWorkflow):
         except Exception as e:
             self.logger(f"[LOCAL] Failed to copy files: {e}")
             self.set_workflow_status("failed")
-            for job in self.jobs:
-                if job.is_input:
-                    continue
-                if job.job_type() == "algorithm":
-                    continue
-                job.set_status("failed")
+            self._set_active_jobs_status("failed")
             raise
 
         # Set status to ready for local execution
@@ -88,70 +186,79 @@ class DryWorkflow(VWorkflow):
         # Write workflow info
         self.logger(f"[LOCAL] Writing workflow info to {os.path.join(self.local_exec_path, 'workflow_info.json')}")
         with open(os.path.join(self.local_exec_path, "workflow_info.json"), "w") as f:
-            json.dump(workflow_info, f, indent=2)
+            # Compact: the file is read back by update_workflow_status, not by people
+            json.dump(workflow_info, f, separators=(",", ":"))
+        self._step_uuids = [step["name"][4:] for step in self.steps]
 
     def copy_files_local(self):
         """Copy all files to local execution directory."""
+        # (source, destination, log message) of every file to copy
+        copies = []
+        # Destination directories, created once each before copying
+        parents = set()
         total_jobs = len(self.jobs)
         for j_idx, job in enumerate(self.jobs):
-            job_dir = os.path.join(self.local_exec_path, f"imp{job.short_uuid()}")
-
+            job_prefix = f"[LOCAL] [Job {j_idx+1}/{total_jobs}]"
             # Copy job files
+            contents_path = os.path.join(job.path, "contents")
             files = job.files()
             total_files = len(files)
             for f_idx, name in enumerate(files):
-                src_path = os.path.join(job.path, "contents", name[8:])
+                src_path = os.path.join(contents_path, name[8:])
                 dst_path = os.path.join(self.local_exec_path, "imp" + name)
-                os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-                if os.path.exists(src_path):
-                    shutil.copy2(src_path, dst_path)
-                    self.logger(f"[LOCAL] [Job {j_idx+1}/{total_jobs}] Copied file {f_idx+1}/{total_files}: {name}")
+                parents.add(os.path.dirname(dst_path))
+                # Missing sources are skipped by _copy_files
+                copies.append((src_path, dst_path, f"{job_prefix} Copied file {f_idx+1}/{total_files}: {name}"))
 
             # Handle rawdata environment
             if job.environment() == "rawdata":
                 rawdata_path = os.path.join(job.path, "rawdata")
-                if os.path.exists(rawdata_path):
+                try:
                     filelist = os.listdir(rawdata_path)
+                except FileNotFoundError:
+                    filelist = []
+                if filelist:
+                    stage_dir = os.path.join(self.local_exec_path, f"imp{job.short_uuid()}", "stageout")
+                    parents.add(stage_dir)
                     total_raw = len(filelist)
                     for f_idx, filename in enumerate(filelist):
-                        src_path = os.path.join(rawdata_path, filename)
-                        dst_path = os.path.join(
-                            self.local_exec_path,
-                            f"imp{job.short_uuid()}",
-                            "stageout",
-                            filename
-                        )
-                        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-                        shutil.copy2(src_path, dst_path)
-                        self.logger(f"[LOCAL] [Job {j_idx+1}/{total_jobs}] Copied rawdata {f_idx+1}/{total_raw}: {filename}")
+                        copies.append((
+                            os.path.join(rawdata_path, filename),
+                            os.path.join(stage_dir, filename),
+                            f"{job_prefix} Copied rawdata {f_idx+1}/{total_raw}: {filename}"
+                        ))
 
             # Handle input jobs (copy from dependency workflows)
             elif job.is_input:
                 impression = job.path.split("/")[-1]
                 src_stageout = os.path.join(
-                    os.environ["HOME"],
-                    ".Yuki",
-                    "Storage",
-                    self.project_uuid,
+                    self._storage_prefix,
                     impression,
                     job.machine_id,
                     "stageout"
                 )
 
-                if os.path.exists(src_stageout):
+                try:
                     filelist = os.listdir(src_stageout)
+                except FileNotFoundError:
+                    filelist = []
+                if filelist:
+                    stage_dir = os.path.join(self.local_exec_path, f"imp{job.short_uuid()}", "stageout")
+                    parents.add(stage_dir)
                     total_input = len(filelist)
                     for f_idx, filename in enumerate(filelist):
-                        src_path = os.path.join(src_stageout, filename)
-                        dst_path = os.path.join(
-                            self.local_exec_path,
-                            f"imp{job.short_uuid()}",
-                            "stageout",
-                            filename
-                        )
-                        os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-                        shutil.copy2(src_path, dst_path)
-                        self.logger(f"[LOCAL] [Job {j_idx+1}/{total_jobs}] Copied input {f_idx+1}/{total_input}: {filename}")
+                        copies.append((
+                            os.path.join(src_stageout, filename),
+                            os.path.join(stage_dir, filename),
+                            f"{job_prefix} Copied input {f_idx+1}/{total_input}: {filename}"
+                        ))
+
+        # os.makedirs creates the missing ancestors, so only the deepest
+        # directories need a call
+        ancestors = {os.path.dirname(parent) for parent in parents}
+        for parent in parents - ancestors:
+            os.makedirs(parent, exist_ok=True)
+        self._copy_files(copies)
 
         # Copy Snakefile
         shutil.copy2(
@@ -160,33 +267,63 @@ class DryWorkflow(VWorkflow):
         )
         self.logger(f"[LOCAL] Copied: Snakefile")
 
+    def _copy_files(self, copies):
+        """
+        Copy files concurrently, logging progress in order once each copy is done.
+
+        The copies are independent and dominated by syscall latency;
+        the data itself is copied in the kernel by _copy_file.
+        Destinations that are already up to date are skipped, so staging or
+        downloading the same impression again does not copy it again.
+        Sources that do not exist are skipped without a log line. Only every
+        _COPY_LOG_EVERY-th and the last copy, and a summary, go to the workflow
+        log; the other per-file lines are logged to YukiLogger at debug level.
+
+        Args:
+            copies (list): (source, destination, log message) of each file
+        """
+        if not copies:
+            return
+        max_workers = min(_MAX_COPY_WORKERS, (os.cpu_count() or 1) * 4, len(copies))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            copied = executor.map(lambda copy: _copy_if_changed(copy[0], copy[1]), copies)
+            total_copied = total_unchanged = 0
+            for index, ((_, _, message), changed) in enumerate(zip(copies, copied), 1):
+                if changed is None:
+                    continue
+                if changed:
+                    total_copied += 1
+                else:
+                    total_unchanged += 1
+                    message = f"{message} (unchanged)"
+                if index % _COPY_LOG_EVERY == 0 or index == len(copies):
+                    self.logger(message)
+                else:
+                    _log.debug(message)
+        self.logger(f"[LOCAL] Files copied: {total_copied}, unchanged: {total_unchanged}")
+
     def update_workflow_status(self):
         """Update workflow status from local execution."""
         try:
-            # Check if all output files exist
-            all_done = True
             self.logger("[LOCAL] Checking jobs status...")
 
-            # Get jobs from json
-            workflow_info_json = os.path.join(self.local_exec_path, "workflow_info.json")
-            with open(workflow_info_json, "r") as f:
-                workflow_info = json.load(f)
-            jobs = []
-            for step in workflow_info["workflow"]["specification"]["steps"]:
-                name = step["name"]
-                jobs.append(name[4:])
-
-            for job_uuid in jobs:
-                done_file = os.path.join(
-                    self.local_exec_path,
-                    f"{job_uuid}.done"
-                    )
-
-                if not os.path.exists(done_file):
-                    all_done = False
-                    break
-
-            if all_done:
+            # Get jobs from the steps written by create_local_structure, or
+            # from json for a workflow reloaded by uuid
+            jobs = self._step_uuids
+            if jobs is None:
+                # Parsed once and reused by later polls while the file is unchanged
+                workflow_info_json = os.path.join(self.local_exec_path, "workflow_info.json")
+                workflow = CachedConfigFile(workflow_info_json).read_variable("workflow")
+                if workflow is None:
+                    raise FileNotFoundError(f"No workflow info in {workflow_info_json}")
+                jobs = [step["name"][4:] for step in workflow["specification"]["steps"]]
+
+            # Check which output files exist, with one directory scan
+            with os.scandir(self.local_exec_path) as entries:
+                done_files = {entry.name for entry in entries if entry.name.endswith(".done")}
+            completed = sum(1 for job_uuid in jobs if f"{job_uuid}.done" in done_files)
+
+            if completed == len(jobs):
                 status = "finished"
             else:
                 # Check if workflow is running
@@ -196,22 +333,14 @@ class DryWorkflow(VWorkflow):
                 "status": status,
                 "progress": {
                     "total": len(jobs),
-                    "completed": sum(
-                        1 for job_uuid in jobs
-                        if os.path.exists(
-                            os.path.join(
-                                self.local_exec_path,
-                                f"{job_uuid}.done"
-                            )
-                        )
-                    )
+                    "completed": completed
                 }
             }
             self.logger(f"[LOCAL] Workflow status: {status}, Progress: {results['progress']['completed']}/{results['progress']['total']}")
 
             path = os.path.join(self.path, "results.json")
-            results_file = metadata.ConfigFile(path)
-            results_file.write_variable("results", results)
+            results_file = CachedConfigFile(path)
+            results_file.write_variable_if_changed("results", results)
 
         except Exception as e:
             self.logger(f"[LOCAL] Failed to update workflow status: {e}")
@@ -226,12 +355,7 @@ class DryWorkflow(VWorkflow):
         """Kill local workflow execution."""
         self.logger("[LOCAL] Killing local workflow (manual intervention required)")
         self.set_workflow_status("killed")
-        for job in self.jobs:
-            if job.is_input:
-                continue
-            if job.job_type() == "algorithm":
-                continue
-            job.set_status("failed")
+        self._set_active_jobs_status("failed")
 
     def download(self, impression=None):
         """Download/collect results from local execution."""
@@ -243,24 +367,22 @@ class DryWorkflow(VWorkflow):
                 "stageout"
             )
             dst_path = os.path.join(
-                os.environ["HOME"],
-                ".Yuki",
-                "Storage",
-                self.project_uuid,
+                self._storage_prefix,
                 impression,
                 self.machine_id,
                 "stageout"
             )
 
-            if os.path.exists(src_path):
-                os.makedirs(dst_path, exist_ok=True)
-                filelist = os.listdir(src_path)
-                total_files = len(filelist)
-                for i, filename in enumerate(filelist):
-                    src_file = os.path.join(src_path, filename)
-                    dst_file = os.path.join(dst_path, filename)
-                    shutil.copy2(src_file, dst_file)
-                    self.logger(f"[LOCAL] [{i+1}/{total_files}] Collected: {filename}")
+            try:
+                files = _scan_tree(src_path, dst_path)
+            except FileNotFoundError:
+                files = None
+            if files is not None:
+                total_files = len(files)
+                self._copy_files([
+                    (src, dst, f"[LOCAL] [{i+1}/{total_files}] Collected: {name}")
+                    for i, (src, dst, name) in enumerate(files)
+                ])
 
                 # Mark as downloaded
                 open(os.path.join(os.path.dirname(dst_path), "stageout.downloaded"), "w").close()
@@ -279,24 +401,22 @@ class DryWorkflow(VWorkflow):
                 "logs"
             )
             dst_path = os.path.join(
-                os.environ["HOME"],
-                ".Yuki",
-                "Storage",
-                self.project_uuid,
+                self._storage_prefix,
                 impression,
                 self.machine_id,
                 "logs"
             )
 
-            if os.path.exists(src_path):
-                os.makedirs(dst_path, exist_ok=True)
-                filelist = os.listdir(src_path)
-                total_logs = len(filelist)
-                for i, filename in enumerate(filelist):
-                    src_file = os.path.join(src_path, filename)
-                    dst_file = os.path.join(dst_path, filename)
-                    shutil.copy2(src_file, dst_file)
-                    self.logger(f"[LOCAL] [{i+1}/{total_logs}] Collected log: {filename}")
+            try:
+                files = _scan_tree(src_path, dst_path)
+            except FileNotFoundError:
+                files = None
+            if files is not None:
+                total_logs = len(files)
+                self._copy_files([
+                    (src, dst, f"[LOCAL] [{i+1}/{total_logs}] Collected log: {name}")
+                    for i, (src, dst, name) in enumerate(files)
+                ])
 
                 # Mark as downloaded
                 open(os.path.join(os.path.dirname(dst_path), "logs.downloaded"), "w").close()
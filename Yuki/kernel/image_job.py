@@ -7,10 +7,15 @@ and workflow execution capabilities. A image can be determined uniquely by its
 build configuration and dependencies.
 """
 import os
+import itertools
+import logging
 
 from CelebiChrono.utils import csys
-from CelebiChrono.utils import metadata
-from .vjob import VJob
+from .vjob import VJob, expand_placeholders
+from ..utils.cached_metadata import CachedConfigFile
+
+logger = logging.getLogger("YukiLogger")
+
 # from Yuki.kernel.VWorkflow import VWorkflow
 class ImageJob(VJob):
     """
@@ -28,6 +33,8 @@ class ImageJob(VJob):
             path (str): Path to the image job
             machine_id (str): Identifier for the target machine
         """
+        self._inputs = None
+        self._alias_items_cache = None
         super().__init__(path, machine_id)
 
     def inputs(self):
@@ -37,10 +44,23 @@ class ImageJob(VJob):
         Returns:
             tuple: A tuple containing (alias_keys, alias_to_impression_map)
         """
-        print("Check the inputs of the image")
-        alias_to_imp = self.config_file.read_variable("alias_to_impression", {})
-        print(alias_to_imp)
-        return (alias_to_imp.keys(), alias_to_imp)
+        if self._inputs is None:
+            alias_items = self._alias_items()
+            self._inputs = (tuple(alias for alias, _ in alias_items), dict(alias_items))
+        return self._inputs
+
+    def _alias_items(self):
+        """
+        Get the (alias, impression) pairs of the inputs, read once per image.
+
+        Returns:
+            tuple: Tuple of (alias, impression) pairs
+        """
+        if self._alias_items_cache is None:
+            alias_to_imp = self.config_file.read_variable("alias_to_impression", {})
+            logger.debug("Inputs of the image: %s", alias_to_imp)
+            self._alias_items_cache = tuple(alias_to_imp.items())
+        return self._alias_items_cache
 
     def image_id(self):
         """
@@ -52,7 +72,7 @@ class ImageJob(VJob):
         dirs = csys.list_dir(self.path)
         for run in dirs:
             if run.startswith("run."):
-                config_file = metadata.ConfigFile(os.path.join(self.path, run, "status.json"))
+                config_file = CachedConfigFile(os.path.join(self.path, run, "status.json"))
                 status = config_file.read_variable("status", "submitted")
                 if status == "built":
                     return config_file.read_variable("image_id")
@@ -62,62 +82,52 @@ class ImageJob(VJob):
         """
         Generate commands to create and navigate to the impression directory.
 
-        Returns:
-            list: Commands to create and change to the impression directory
+        Yields:
+            str: Commands to create and change to the impression directory
         """
-        return [
-            f"mkdir -p imp{self.short_uuid()}",
-            f"cd imp{self.short_uuid()}"
-        ]
+        short_uuid = self.short_uuid()
+        yield f"mkdir -p imp{short_uuid}"
+        yield f"cd imp{short_uuid}"
 
     def _create_symlink_commands(self):
         """
         Generate commands to create symbolic links for input aliases.
 
-        Returns:
-            list: Commands to create symbolic links to input impressions
+        Yields:
+            str: Commands to create symbolic links to input impressions
         """
-        commands = []
-        alias_list, alias_map = self.inputs()
-        for alias in alias_list:
-            impression = alias_map[alias]
-            command = f"ln -s ../imp{impression[:7]} {alias}"
-            commands.append(command)
-        return commands
+        for alias, impression in self._alias_items():
+            yield f"ln -s ../imp{impression[:7]} {alias}"
 
     def _process_build_rules(self):
         """
         Process and substitute variables in build rules.
 
-        Returns:
-            list: Processed build commands with substituted variables
+        Yields:
+            str: Processed build commands with substituted variables
         """
-        commands = []
         compile_rules = self.yaml_file.read_variable("build", [])
-        alias_list, alias_map = self.inputs()
+        # Workspace and code win over an input alias of the same name. Images
+        # have no parameters and every replacement is a fixed path without
+        # placeholders, so one pass gives what the sequential replaces gave.
+        substitutions = {
+            alias: f"../imp{impression[:7]}" for alias, impression in self._alias_items()
+        }
+        substitutions["workspace"] = ".."
+        substitutions["code"] = f"../imp{self.short_uuid()}"
 
         for rule in compile_rules:
-            rule = rule.replace("${workspace}", "..")
-            rule = rule.replace("${code}", f"../imp{self.short_uuid()}")
-
-            for alias in alias_list:
-                impression = alias_map[alias]
-                rule = rule.replace("${"+ alias +"}", f"../imp{impression[:7]}")
-            commands.append(rule)
-
-        return commands
+            yield expand_placeholders(rule, substitutions)
 
     def _cleanup_commands(self):
         """
         Generate cleanup commands to return to parent directory and mark completion.
 
-        Returns:
-            list: Commands to navigate back and create completion marker
+        Yields:
+            str: Commands to navigate back and create completion marker
         """
-        return [
-            "cd ..",
-            f"touch {self.short_uuid()}.done"
-        ]
+        yield "cd .."
+        yield f"touch {self.short_uuid()}.done"
 
     def _generate_all_commands(self):
         """
@@ -126,12 +136,12 @@ class ImageJob(VJob):
         Returns:
             list: Complete list of shell commands to build the image
         """
-        commands = []
-        commands.extend(self._setup_directory_commands())
-        commands.extend(self._create_symlink_commands())
-        commands.extend(self._process_build_rules())
-        commands.extend(self._cleanup_commands())
-        return commands
+        return list(itertools.chain(
+            self._setup_directory_commands(),
+            self._create_symlink_commands(),
+            self._process_build_rules(),
+            self._cleanup_commands(),
+        ))
 
     def step(self, request_machine):
         """
@@ -182,9 +192,12 @@ class ImageJob(VJob):
         Returns:
             str: Environment specification from YAML configuration or default
         """
+        if self._environment is not None:
+            return self._environment
         environment = self.yaml_file.read_variable("environment", self.default_environment())
         if environment == "script":
-            return self.default_environment()
+            environment = self.default_environment()
+        self._environment = environment
         return environment
 
     def memory(self):
@@ -4,6 +4,12 @@ from .vjob import VJob
 from .vworkflow import VWorkflow
 from ..server.config import config
 
+# Job status -> (message, workflow method) of what collect() retrieves
+_COLLECT_ACTIONS = {
+    "finished": ("Collecting results...", "download"),
+    "failed": ("Collecting logs...", "download_logs"),
+}
+
 class ImpressionStorage:
     def __init__(self, project_uuid, impression):
         self.project_uuid = project_uuid
@@ -18,16 +24,36 @@ class ImpressionStorage:
         # Metadata access
         self.job_config = ConfigFile(config.get_job_config_path(project_uuid, impression))
 
+        # Workflows opened by the last _get_runner_contexts call, see close()
+        self._workflows = []
+
     def _get_runner_contexts(self):
-        """Generator to yield active job/workflow pairs across all machines."""
+        """Return the active (machine, job, workflow) triples across all machines."""
+        self.close()
+        contexts = []
         for machine in self.runners:
             machine_id = self.runners_id.get(machine)
             job = VJob(self.job_path, machine_id)
 
-            if job.workflow_id():
+            workflow_id = job.workflow_id()
+            if workflow_id:
                 # Using the factory method from our previous refactor
-                workflow = VWorkflow.create(self.project_uuid, [], job.workflow_id())
-                yield machine, job, workflow
+                workflow = VWorkflow.create(self.project_uuid, [], workflow_id)
+                contexts.append((machine, job, workflow))
+        self._workflows = [workflow for _, _, workflow in contexts]
+        return contexts
+
+    def close(self):
+        """Close the log files of the workflows opened for the runner contexts."""
+        for workflow in self._workflows:
+            workflow.close()
+        self._workflows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def kill(self):
         """Kills all workflows associated with this storage entry."""
@@ -39,13 +65,12 @@ class ImpressionStorage:
     def collect(self):
         """Retrieves files or logs from runners."""
         for name, job, workflow in self._get_runner_contexts():
-            if job.status() == "finished":
-                print(f"[{name}] Collecting results...")
-                workflow.download(self.impression)
-                # workflow.download_outputs(self.impression)
-            elif job.status() == "failed":
-                print(f"[{name}] Collecting logs...")
-                workflow.download_logs(self.impression)
+            action = _COLLECT_ACTIONS.get(job.status())
+            if action is None:
+                continue
+            message, method = action
+            print(f"[{name}] {message}")
+            getattr(workflow, method)(self.impression)
 
     def collect_outputs(self):
         """Retrieves only output files from runners."""
@@ -57,7 +82,7 @@ class ImpressionStorage:
     def collect_logs(self):
         """Retrieves only logs from runners."""
         for name, job, workflow in self._get_runner_contexts():
-            if job.status() == "finished" or job.status() == "failed":
+            if job.status() in ("finished", "failed"):
                 print(f"[{name}] Collecting logs...")
                 workflow.download_logs(self.impression)
 
@@ -70,6 +95,8 @@ class ImpressionStorage:
 
     def get_info(self):
         """Returns the location and ID of the first active runner."""
-        for name, _, workflow in self._get_runner_contexts():
+        contexts = self._get_runner_contexts()
+        if contexts:
+            name, _, workflow = contexts[0]
             return f"{name} {workflow.uuid}"
         return "UNDEFINED"
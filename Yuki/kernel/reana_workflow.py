@@ -9,6 +9,7 @@ import time
 import json
 from .vworkflow import VWorkflow
 from CelebiChrono.utils import metadata
+from ..utils.cached_metadata import CachedConfigFile, yuki_config
 
 class ReanaWorkflow(VWorkflow):
     """REANA implementation of VWorkflow."""
@@ -27,12 +28,7 @@ class ReanaWorkflow(VWorkflow):
         except Exception as e:
             self.logger(f"Failed to create the workflow: {e}")
             self.set_workflow_status("failed")
-            for job in self.jobs:
-                if job.is_input:
-                    continue
-                if job.job_type() == "algorithm":
-                    continue
-                job.set_status("failed")
+            self._set_active_jobs_status("failed")
             raise
         
 
@@ -42,24 +38,14 @@ class ReanaWorkflow(VWorkflow):
         except:
             self.logger("Failed to upload the files")
             self.set_workflow_status("failed")
-            for job in self.jobs:
-                if job.is_input:
-                    continue
-                if job.job_type() == "algorithm":
-                    continue
-                job.set_status("failed")
+            self._set_active_jobs_status("failed")
             raise
 
         try:
             self.start_workflow()
         except:
             self.set_workflow_status("failed")
-            for job in self.jobs:
-                if job.is_input:
-                    continue
-                if job.job_type() == "algorithm":
-                    continue
-                job.set_status("failed")
+            self._set_active_jobs_status("failed")
             raise
 
     def _sync_external_job_status(self, job):
@@ -89,9 +75,7 @@ class ReanaWorkflow(VWorkflow):
     def set_enviroment(self, machine_id):
         """Set the environment variable for REANA server URL."""
         # Set the environment variable
-        path = os.path.join(os.environ["HOME"], ".Yuki", "config.json")
-        config_file = metadata.ConfigFile(path)
-        urls = config_file.read_variable("urls", {})
+        urls = yuki_config().read_variable("urls", {})
         url = urls.get(machine_id, "")
         self.logger(f"machine_id = {machine_id}")
         self.logger(f"reana_url = {url}")
@@ -102,9 +86,7 @@ class ReanaWorkflow(VWorkflow):
 
     def get_access_token(self, machine_id):
         """Get access token for the specified machine."""
-        path = os.path.join(os.environ["HOME"], ".Yuki", "config.json")
-        config_file = metadata.ConfigFile(path)
-        tokens = config_file.read_variable("tokens", {})
+        tokens = yuki_config().read_variable("tokens", {})
         token = tokens.get(machine_id, "")
         return token
 
@@ -193,7 +175,7 @@ class ReanaWorkflow(VWorkflow):
                     continue
                 impression = job.path.split("/")[-1]
                 # self.logger(f"Downloading the files from impression {impression}")
-                path = os.path.join(os.environ["HOME"], ".Yuki", "Storage", self.project_uuid, impression, job.machine_id)
+                path = os.path.join(self._storage_prefix, impression, job.machine_id)
                 if not os.path.exists(os.path.join(path, "stageout")):
                     workflow = ReanaWorkflow(self.project_uuid, [], job.workflow_id())
                     workflow.download_outputs(impression)
@@ -244,14 +226,14 @@ class ReanaWorkflow(VWorkflow):
                 self.get_name(),
                 self.get_access_token(self.machine_id))
             path = os.path.join(self.path, "results.json")
-            results_file = metadata.ConfigFile(path)
-            results_file.write_variable("results", results)
+            results_file = CachedConfigFile(path)
+            results_file.write_variable_if_changed("results", results)
             logpath = os.path.join(self.path, "log.json")
-            log_file = metadata.ConfigFile(logpath)
+            log_file = CachedConfigFile(logpath)
             logstring = results.get("logs", "{}")
             # decode the logstring with json
             log = json.loads(logstring)
-            log_file.write_variable("logs", log)
+            log_file.write_variable_if_changed("logs", log)
             self.logger(f"Workflow status: {results.get('status', 'unknown')}")
         except Exception as e:
             self.logger(f"Failed to update the workflow status: {e}")
@@ -262,7 +244,7 @@ class ReanaWorkflow(VWorkflow):
         from reana_client.api import client
         self.set_enviroment(self.machine_id)
         if impression:
-            path = os.path.join(os.environ["HOME"], ".Yuki", "Storage", self.project_uuid, impression, self.machine_id)
+            path = os.path.join(self._storage_prefix, impression, self.machine_id)
             try: # try to download the files
                 if not os.path.exists(os.path.join(path, "stageout.downloaded")):
                     files = client.list_files(
@@ -318,7 +300,7 @@ class ReanaWorkflow(VWorkflow):
         from reana_client.api import client
         self.set_enviroment(self.machine_id)
         if impression:
-            path = os.path.join(os.environ["HOME"], ".Yuki", "Storage", self.project_uuid, impression, self.machine_id)
+            path = os.path.join(self._storage_prefix, impression, self.machine_id)
             try:
                 if not os.path.exists(os.path.join(path, "stageout.downloaded")):
                     files = client.list_files(
@@ -350,7 +332,7 @@ class ReanaWorkflow(VWorkflow):
         from reana_client.api import client
         self.set_enviroment(self.machine_id)
         if impression:
-            path = os.path.join(os.environ["HOME"], ".Yuki", "Storage", self.project_uuid, impression, self.machine_id)
+            path = os.path.join(self._storage_prefix, impression, self.machine_id)
             try:
                 if not os.path.exists(os.path.join(path, "logs.downloaded")):
                     files = client.list_files(
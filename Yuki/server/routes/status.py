@@ -49,8 +49,8 @@ def status(project_uuid, impression_name):
         if job.workflow_id() == "":
             continue
         print("Checking status for job", job)
-        workflow = VWorkflow.create(project_uuid, [], job.workflow_id())
-        workflow_status = workflow.status()
+        with VWorkflow.create(project_uuid, [], job.workflow_id()) as workflow:
+            workflow_status = workflow.status()
         # print("Status from workflow", workflow_status)
         workflow_path = os.path.join(
             os.environ["HOME"],
@@ -101,13 +101,13 @@ def runstatus(project_uuid, impression_name, machine):
         for runner in runners_id:
             machine_id = runners_id[runner]
             job = VJob(job_path, None)
-            workflow = VWorkflow.create(project_uuid, [], job.workflow_id())
-            return workflow.status()
+            with VWorkflow.create(project_uuid, [], job.workflow_id()) as workflow:
+                return workflow.status()
 
     machine_id = runners_id[machine]
     job = VJob(job_path, machine_id)
-    workflow = VWorkflow.create(project_uuid, [], job.workflow_id())
-    return workflow.status()
+    with VWorkflow.create(project_uuid, [], job.workflow_id()) as workflow:
+        return workflow.status()
 
 
 @bp.route("/deposited/<project_uuid>/<impression_name>", methods=['GET'])
@@ -474,6 +474,6 @@ def homekeep(project_uuid):
         return ""
     workflow_ids = os.listdir(workflows_path)
     for workflow_id in workflow_ids:
-        workflow = VWorkflow.create(project_uuid, [], workflow_id)
-        workflow.homekeep()
+        with VWorkflow.create(project_uuid, [], workflow_id) as workflow:
+            workflow.homekeep()
     return "ok"
\ No newline at end of file
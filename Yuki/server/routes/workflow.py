@@ -5,35 +5,35 @@ bp = Blueprint('workflow', __name__)
 
 @bp.route("/kill/<project_uuid>/<impression>", methods=['GET'])
 def kill(project_uuid, impression):
-    storage = ImpressionStorage(project_uuid, impression)
-    storage.kill()
+    with ImpressionStorage(project_uuid, impression) as storage:
+        storage.kill()
     return "ok"
 
 @bp.route("/collect/<project_uuid>/<impression>", methods=['GET'])
 def collect(project_uuid, impression):
-    storage = ImpressionStorage(project_uuid, impression)
-    storage.collect()
+    with ImpressionStorage(project_uuid, impression) as storage:
+        storage.collect()
     return "ok"
 
 @bp.route("/collect-outputs/<project_uuid>/<impression>", methods=['GET'])
 def collect_outputs(project_uuid, impression):
-    storage = ImpressionStorage(project_uuid, impression)
-    storage.collect_outputs()
+    with ImpressionStorage(project_uuid, impression) as storage:
+        storage.collect_outputs()
     return "ok"
 
 @bp.route("/collect-logs/<project_uuid>/<impression>", methods=['GET'])
 def collect_logs(project_uuid, impression):
-    storage = ImpressionStorage(project_uuid, impression)
-    storage.collect_logs()
+    with ImpressionStorage(project_uuid, impression) as storage:
+        storage.collect_logs()
     return "ok"
 
 @bp.route("/watermark/<project_uuid>/<impression>", methods=['GET'])
 def watermark(project_uuid, impression):
-    storage = ImpressionStorage(project_uuid, impression)
-    storage.watermark()
+    with ImpressionStorage(project_uuid, impression) as storage:
+        storage.watermark()
     return "ok"
 
 @bp.route('/workflow/<project_uuid>/<impression>', methods=['GET'])
 def workflow(project_uuid, impression):
-    storage = ImpressionStorage(project_uuid, impression)
-    return storage.get_info()
+    with ImpressionStorage(project_uuid, impression) as storage:
+        return storage.get_info()
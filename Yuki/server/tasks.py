@@ -40,7 +40,10 @@ def task_exec_impression(project_uuid, impressions, machine_uuid):
     backend_type = backend_types.get(machine_uuid, "reana")
     workflow = VWorkflow.create(project_uuid, jobs, None, mode=backend_type)
     print("workflow", workflow)
-    workflow.run()
+    try:
+        workflow.run()
+    finally:
+        workflow.close()
 
 
 @celeryapp.task
@@ -48,5 +51,8 @@ def task_update_workflow_status(project_uuid, workflow_id):
     """Update workflow status as a background task."""
     print("# >>> task_update_workflow_status")
     workflow = VWorkflow.create(project_uuid, [], workflow_id)
-    workflow.update_workflow_status()
+    try:
+        workflow.update_workflow_status()
+    finally:
+        workflow.close()
     print("# <<< task_update_workflow_status")
@@ -0,0 +1,198 @@
+"""
+Cached metadata readers for Yuki.
+
+The CelebiChrono ``ConfigFile`` and ``YamlFile`` helpers re-open and re-parse
+their file on every ``read_variable`` call. Jobs read the same handful of
+small files (config.json, status.json, celebi.yaml) many times while a
+workflow is built and polled, so the classes here keep the parsed contents
+in a process-wide cache keyed by path and validated against the file's
+inode, modification time and size.
+
+A file modified within the last second is not cached: another process may
+rewrite it with the same size within the same timestamp tick, which the
+cache could not tell apart (the "racy clean" case git guards against too).
+
+Values returned by ``read_variable`` are copies, so callers may modify them
+without affecting other readers.
+"""
+import os
+import json
+import time
+import fcntl
+
+import yaml
+from CelebiChrono.utils import metadata
+
+try:
+    import orjson
+except ImportError:  # optional, stdlib json is used without it
+    orjson = None
+
+# path -> ((st_ino, st_mtime_ns, st_size), parsed data)
+_CACHE = {}
+_MAX_ENTRIES = 4096
+# Files modified more recently than this are re-read on every access
+_RACY_WINDOW_NS = 1_000_000_000
+_MISSING = object()
+
+
+def _load(path, parse):
+    """
+    Return the parsed contents of path, re-parsing only if the file changed.
+
+    Args:
+        path (str): Path to the metadata file
+        parse (callable): Function parsing the raw file contents (bytes)
+
+    Returns:
+        The parsed data, or None if the file is missing or empty
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    cached = _CACHE.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with open(path, "rb") as f:
+        contents = f.read()
+    data = parse(contents) if contents.strip() else None
+    if time.time_ns() - stat.st_mtime_ns < _RACY_WINDOW_NS:
+        # A same-size rewrite in the same tick would keep the key, don't trust it yet
+        _CACHE.pop(path, None)
+        return data
+    if len(_CACHE) >= _MAX_ENTRIES:
+        _CACHE.clear()
+    _CACHE[path] = (key, data)
+    return data
+
+
+def _copy(value):
+    """Copy the dicts and lists of a parsed value so the cached one stays intact."""
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+def invalidate(path):
+    """Drop the cached contents of path."""
+    _CACHE.pop(path, None)
+
+
+def _parse_json(contents):
+    if orjson is not None:
+        try:
+            return orjson.loads(contents)
+        except orjson.JSONDecodeError:
+            # orjson is stricter (e.g. NaN), let json decide
+            pass
+    return json.loads(contents)
+
+
+def _parse_yaml(contents):
+    return yaml.load(contents.decode('utf-8'), Loader=yaml.Loader)
+
+
+class CachedConfigFile(metadata.ConfigFile):
+    """ConfigFile whose reads are served from the shared metadata cache."""
+
+    def read_variable(self, variable_name, default=None):
+        data = _load(self.file_path, _parse_json)
+        if data is None or variable_name not in data:
+            return default
+        return _copy(data[variable_name])
+
+    def write_variable(self, variable_name, value):
+        super().write_variable(variable_name, value)
+        invalidate(self.file_path)
+
+    def write_variable_if_changed(self, variable_name, value):
+        """
+        Write a variable unless the file already holds the same value.
+
+        Pollers rewrite the same results on every check; skipping unchanged
+        values saves the locked read-modify-write and keeps the file's
+        modification time meaningful for readers watching it.
+
+        Args:
+            variable_name (str): Name of the variable
+            value: JSON-serializable value to write
+
+        Returns:
+            bool: Whether the file was written
+        """
+        data = _load(self.file_path, _parse_json)
+        if data is not None and data.get(variable_name, _MISSING) == value:
+            return False
+        self.write_variable(variable_name, value)
+        return True
+
+    def write_variables(self, variables):
+        """
+        Write several variables to the JSON file in one locked update.
+
+        Args:
+            variables (dict): Mapping from variable name to value
+        """
+        self._locked_update(lambda data: data.update(variables))
+
+    def update_variable(self, variable_name, changes, default=None):
+        """
+        Update the keys of a dict-valued variable in one locked read-modify-write.
+
+        Args:
+            variable_name (str): Name of the variable holding a dict
+            changes (dict): Keys and values to set in that dict
+            default (dict): Value of the variable if it is not set yet
+        """
+        def update(data):
+            value = dict(data.get(variable_name, default or {}))
+            value.update(changes)
+            data[variable_name] = value
+        self._locked_update(update)
+
+    def _locked_update(self, update):
+        """Apply update to the parsed file contents under an exclusive lock."""
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        if not os.path.exists(self.file_path):
+            with open(self.file_path, "w", encoding='utf-8') as f:
+                json.dump({}, f)
+
+        with open(self.file_path, "r+", encoding='utf-8') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            contents = f.read()
+            data = json.loads(contents) if contents.strip() else {}
+            update(data)
+            f.seek(0)
+            f.truncate()
+            json.dump(data, f)
+            fcntl.flock(f, fcntl.LOCK_UN)
+        invalidate(self.file_path)
+
+
+class CachedYamlFile(metadata.YamlFile):
+    """YamlFile whose reads are served from the shared metadata cache."""
+
+    def read_variable(self, variable_name, default=None):
+        data = _load(self.file_path, _parse_yaml)
+        if not isinstance(data, dict) or variable_name not in data:
+            return default
+        return _copy(data[variable_name])
+
+    def write_variable(self, variable_name, value):
+        super().write_variable(variable_name, value)
+        invalidate(self.file_path)
+
+
+def yuki_config():
+    """
+    Get a cached reader for the user's ~/.Yuki/config.json.
+
+    Returns:
+        CachedConfigFile: Reader of the Yuki configuration file
+    """
+    return CachedConfigFile(os.path.join(os.environ["HOME"], ".Yuki", "config.json"))
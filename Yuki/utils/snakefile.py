@@ -9,12 +9,20 @@ class SnakeFile(object):
         create a file if it is not initially exists
         """
         self.file_path = file_path
-        self.contents = ""
+        self._lines = []
+
+    @property
+    def contents(self):
+        return "".join(self._lines)
 
     def addline(self, string, index):
-        self.contents += (" "*index*4 + string + "\n")
+        self._lines.append(" "*index*4 + string + "\n")
+
+    def addtext(self, text):
+        """ Append already formatted text, e.g. a whole rule
+        """
+        self._lines.append(text)
 
     def write(self):
-        f = open(self.file_path, "w")
-        f.write(self.contents)
-        f.close()
+        with open(self.file_path, "w") as f:
+            f.write(self.contents)